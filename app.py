@@ -1,13 +1,25 @@
+import base64
+import json
+import os
+import queue
 import threading
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, jsonify, flash
 from flask_migrate import Migrate
+from sqlalchemy.orm import defer
 
 import config
-from models import db, Job
-from workers import process_scraping_job
+import metrics
+from events import job_events
+from job_store import job_store
+from models import db, Job, JobStage, upgrade_schema
+from scrapers.llm_backends import available_backends
+from scrapers.manage_browser import browser_pool
+from scrapers.tracing import percentile
+from urls import canonicalize_url
+from workers import JobScheduler
 
 app = Flask(__name__)
 app.config.from_object(config.Config)
@@ -19,6 +31,37 @@ migrate = Migrate(app, db)
 # Create tables
 with app.app_context():
     db.create_all()
+    upgrade_schema()
+    
+    # Canonicalize the URLs of jobs created before they were stored
+    for job in Job.query.filter(Job.canonical_url.is_(None)):
+        job.canonical_url = canonicalize_url(job.url, job.platform)
+    db.session.commit()
+
+# Write the job progress to the database in batches
+job_store.init_app(app)
+
+def count_waiting_jobs():
+    """Number of pending jobs in the job table"""
+    with app.app_context():
+        return Job.query.filter(Job.status == 'pending').count()
+
+# Start the job workers, unless the jobs are run by standalone workers
+scheduler = JobScheduler(app.config['WORKER_COUNT'], app.config['JOB_QUEUE_SIZE'])
+if app.config['EMBEDDED_WORKERS']:
+    scheduler.start()
+    scheduler.init_app(app)
+    metrics.track_scheduler(scheduler, browser_pool)
+else:
+    metrics.track_job_table(count_waiting_jobs)
+
+# Pre-launch browsers so the first jobs don't wait for browser startup
+if app.config['EMBEDDED_WORKERS'] and os.environ.get('BROWSER_POOL_WARM', 'true').lower() == 'true':
+    threading.Thread(target=browser_pool.warm, daemon=True).start()
+
+@app.context_processor
+def inject_llm_backends():
+    return {'llm_backends': available_backends()}
 
 @app.route('/')
 def index():
@@ -33,65 +76,243 @@ def submit_job():
     url = request.form.get('url')
     platform = request.form.get('platform')
     target = request.form.get('target')
+    llm_backend = request.form.get('llm_backend') or None
     
     if not url:
         flash('Please enter a URL', 'error')
         return redirect(url_for('index'))
     
+    if llm_backend and llm_backend not in available_backends():
+        flash(f'Unknown AI backend: {llm_backend}', 'error')
+        return redirect(url_for('index'))
+    
+    # Show the existing result if this post was already imported to the same target
+    canonical_url = canonicalize_url(url, platform)
+    if request.form.get('force') != 'on':
+        existing_job = Job.query.filter_by(
+            canonical_url=canonical_url,
+            target=target,
+            status='completed'
+        ).order_by(Job.completed_at.desc()).first()
+        if existing_job:
+            flash('This post was already imported. Check "Import again" to run it again.', 'info')
+            return redirect(url_for('view_job', job_id=existing_job.id))
+    
     # Create a new job
     job_id = str(uuid.uuid4())
     job = Job(
         id=job_id,
         url=url,
+        canonical_url=canonical_url,
         platform=platform,
         target=target,
         status='pending',
+        bypass_cache=request.form.get('bypass_cache') == 'on',
+        llm_backend=llm_backend,
+        max_attempts=app.config['JOB_MAX_ATTEMPTS'],
         created_at=datetime.now()
     )
     
     db.session.add(job)
     db.session.commit()
     
-    # Start the job in a background thread
-    threading.Thread(
-        target=process_scraping_job,
-        args=(job_id,),
-        daemon=True
-    ).start()
+    # Hand the job over to the workers, push back if the queue is full.
+    # Standalone workers pick the job up from the database.
+    if app.config['EMBEDDED_WORKERS'] and not scheduler.submit(job_id):
+        db.session.delete(job)
+        db.session.commit()
+        flash('Too many jobs are queued right now, please try again later', 'error')
+        return render_template('index.html'), 429
     
     return redirect(url_for('view_job', job_id=job_id))
 
 @app.route('/job/<job_id>')
 def view_job(job_id):
-    job = Job.query.get_or_404(job_id)
-    return render_template('job.html', job=job)
+    job = load_job_state(Job.query.get_or_404(job_id))
+    queue_position = scheduler.queue_position(job_id) if job.status == 'pending' else None
+    stages = JobStage.query.filter_by(job_id=job_id).order_by(JobStage.started_at, JobStage.id).all()
+    return render_template('job.html', job=job, queue_position=queue_position, waterfall=stage_waterfall(stages))
+
+def stage_waterfall(stages):
+    """
+    Position the stages of a job on a timeline.
+    Returns:
+        list: One dict per stage with its offset and width in percent of the job duration.
+    """
+    if not stages:
+        return []
+    start = min(stage.started_at for stage in stages)
+    total = max((max(stage.ended_at for stage in stages) - start).total_seconds(), 0.001)
+    return [{
+        'name': stage.name,
+        'duration': stage.duration,
+        'outcome': stage.outcome,
+        'error': stage.error,
+        'offset': (stage.started_at - start).total_seconds() / total * 100,
+        'width': max(stage.duration / total * 100, 0.5)
+    } for stage in stages]
 
 @app.route('/api/job/<job_id>/delete', methods=['POST'])
 def delete_job(job_id):
     job = Job.query.get_or_404(job_id)
+    JobStage.query.filter_by(job_id=job_id).delete()
     db.session.delete(job)
     db.session.commit()
     return redirect(url_for('history'))
 
-@app.route('/api/job/<job_id>')
-def get_job_status(job_id):
-    job = Job.query.get_or_404(job_id)
-    return jsonify({
+def load_job_state(job):
+    """Apply the job state that was not written to the database yet"""
+    state = job_store.get(job.id)
+    if state:
+        db.session.expunge(job)
+        for key, value in state.items():
+            setattr(job, key, value)
+    return job
+
+def job_status(job):
+    """Status of a job as returned by the API"""
+    return {
         'status': job.status,
         'progress': job.progress,
         'message': job.message,
+        'queue_position': scheduler.queue_position(job.id) if job.status == 'pending' else None,
         'result_url': job.result_url if job.status == 'completed' else None
+    }
+
+@app.route('/api/job/<job_id>')
+def get_job_status(job_id):
+    # Running jobs are served from memory
+    state = job_store.get(job_id)
+    if state and all(key in state for key in ('status', 'progress', 'message')):
+        return jsonify({
+            'status': state['status'],
+            'progress': state['progress'],
+            'message': state['message'],
+            'queue_position': None,
+            'result_url': state.get('result_url') if state['status'] == 'completed' else None
+        })
+    
+    job = load_job_state(Job.query.get_or_404(job_id))
+    return jsonify(job_status(job))
+
+@app.route('/api/job/<job_id>/events')
+def job_status_events(job_id):
+    """Stream the status updates of a job as Server-Sent Events"""
+    # Subscribe before reading the job so no update is missed
+    subscription = job_events.subscribe(job_id)
+    job = Job.query.get(job_id)
+    if not job:
+        job_events.unsubscribe(job_id, subscription)
+        abort(404)
+    load_job_state(job)
+    status = job_status(job)
+    db.session.remove()
+    
+    # Standalone workers don't publish to this process, read the job from the database instead
+    embedded = app.config['EMBEDDED_WORKERS']
+    timeout = 15 if embedded else app.config['WORKER_POLL_INTERVAL']
+    
+    def stream():
+        try:
+            data = status
+            while True:
+                yield f"data: {json.dumps(data)}\n\n"
+                if data.get('status') in ['completed', 'failed']:
+                    return
+                
+                # Send a comment now and then to keep the connection open
+                while True:
+                    try:
+                        data = subscription.get(timeout=timeout)
+                        break
+                    except queue.Empty:
+                        if not embedded:
+                            latest = read_job_status(job_id)
+                            if latest and latest != data:
+                                data = latest
+                                break
+                        yield ": keep-alive\n\n"
+        finally:
+            job_events.unsubscribe(job_id, subscription)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
+def read_job_status(job_id):
+    """Read the status of a job from the database, outside of a request"""
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        return job_status(job) if job else None
+
+def query_jobs(cursor=None, limit=50, status=None, platform=None, target=None):
+    """
+    Get a page of jobs, newest first, using keyset pagination on (created_at, id).
+    
+    Args:
+        cursor (str, optional): The cursor returned with the previous page.
+        limit (int, optional): The maximum number of jobs to return.
+        status (str, optional): Only return jobs with this status.
+        platform (str, optional): Only return jobs for this platform.
+        target (str, optional): Only return jobs for this target.
+    
+    Returns:
+        tuple: (jobs, next_cursor), next_cursor is None on the last page.
+    
+    Raises:
+        ValueError: If the cursor is invalid.
+    """
+    # The result column can be large and is not needed in lists
+    query = Job.query.options(defer(Job.result))
+    if status:
+        query = query.filter(Job.status == status)
+    if platform:
+        query = query.filter(Job.platform == platform)
+    if target:
+        query = query.filter(Job.target == target)
+    
+    if cursor:
+        created_at, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        created_at = datetime.fromisoformat(created_at)
+        query = query.filter(db.or_(
+            Job.created_at < created_at,
+            db.and_(Job.created_at == created_at, Job.id < job_id)
+        ))
+    
+    jobs = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(jobs) > limit:
+        jobs = jobs[:limit]
+        last = jobs[-1]
+        next_cursor = base64.urlsafe_b64encode(f'{last.created_at.isoformat()}|{last.id}'.encode()).decode()
+    return jobs, next_cursor
+
+def job_filters():
+    """Job list filters and page size from the query string"""
+    return {
+        'status': request.args.get('status') or None,
+        'platform': request.args.get('platform') or None,
+        'target': request.args.get('target') or None,
+        'limit': min(max(request.args.get('limit', 50, type=int), 1), 200)
+    }
+
 @app.route('/history')
 def history():
-    jobs = Job.query.order_by(Job.created_at.desc()).all()
-    return render_template('history.html', jobs=jobs)
+    filters = job_filters()
+    try:
+        jobs, next_cursor = query_jobs(request.args.get('cursor'), **filters)
+    except ValueError:
+        abort(400)
+    return render_template('history.html', jobs=jobs, next_cursor=next_cursor, filters=filters)
 
 @app.route('/api/jobs')
 def api_jobs():
-    jobs = Job.query.order_by(Job.created_at.desc()).all()
-    return jsonify([{
+    try:
+        jobs, next_cursor = query_jobs(request.args.get('cursor'), **job_filters())
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    response = jsonify([{
         'id': job.id,
         'url': job.url,
         'platform': job.platform,
@@ -100,6 +321,47 @@ def api_jobs():
         'created_at': job.created_at.isoformat(),
         'completed_at': job.completed_at.isoformat() if job.completed_at else None
     } for job in jobs])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@app.route('/api/stats')
+def api_stats():
+    """
+    Duration percentiles of every job stage.
+    Query parameters:
+        hours (float): Only include the stages started in this many last hours (default 24).
+    """
+    hours = request.args.get('hours', 24, type=float)
+    since = datetime.now() - timedelta(hours=hours)
+    rows = db.session.query(JobStage.name, JobStage.duration, JobStage.outcome).filter(JobStage.started_at >= since)
+    
+    durations = {}
+    errors = {}
+    for name, duration, outcome in rows:
+        durations.setdefault(name, []).append(duration)
+        if outcome != 'ok':
+            errors[name] = errors.get(name, 0) + 1
+    
+    return jsonify({
+        'since': since.isoformat(),
+        'stages': {
+            name: {
+                'count': len(values),
+                'errors': errors.get(name, 0),
+                'mean': sum(values) / len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99)
+            }
+            for name, values in sorted(durations.items())
+        }
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
 
 if __name__ == '__main__':
     
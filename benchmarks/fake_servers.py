@@ -0,0 +1,245 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from PIL import Image
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as fixture:
+        return fixture.read()
+
+def _sleep(server):
+    # Simulated latency, +/- jitter
+    if server.latency > 0:
+        time.sleep(server.latency * random.uniform(1 - server.jitter, 1 + server.jitter))
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep the connections alive like the real servers
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+    
+    def _send(self, status, body, content_type="application/json"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class SocialProxyHandler(_Handler):
+    """
+    Serves the Instagram and TikTok fixtures. Used as HTTP proxy, so the
+    post URLs keep their real host names (with http:// instead of https://).
+    The post ID of the URL replaces {post_id} in the fixture, so every post
+    has its own caption.
+    """
+    
+    def do_GET(self):
+        _sleep(self.server)
+        parts = urlsplit(self.path)
+        host = parts.netloc or self.headers.get("Host", "")
+        path = parts.path
+        
+        if path.endswith((".jpg", ".webp")):
+            return self._send(200, self.server.thumbnail, "image/jpeg")
+        
+        if "instagram.com" in host:
+            match = re.search(r"/(?:p|reels?|tv)/([^/]+)", path)
+            fixture = self.server.instagram
+        elif "tiktok.com" in host:
+            match = re.search(r"/video/(\d+)", path)
+            fixture = self.server.tiktok
+        else:
+            match = fixture = None
+        
+        if not match:
+            return self._send(404, "Not found", "text/plain")
+        self._send(200, fixture.replace("{post_id}", match.group(1)), "text/html; charset=utf-8")
+
+class OpenAIHandler(_Handler):
+    """
+    Fake OpenAI chat completions API answering the recipe prompts with the
+    replies of fixtures/llm_replies.json.
+    """
+    
+    def do_POST(self):
+        request = json.loads(self._read_body() or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send(404, json.dumps({"error": {"message": "Not found"}}))
+        
+        _sleep(self.server)
+        messages = request.get("messages", [])
+        reply = self._reply(messages[-1]["content"] if messages else "", "response_format" in request)
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+        if request.get("stream"):
+            return self._send_stream(request, reply, prompt_tokens)
+        self._send(200, json.dumps({
+            "id": f"chatcmpl-bench{random.randrange(10**9)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "bench"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(reply) // 4,
+                "total_tokens": prompt_tokens + len(reply) // 4
+            }
+        }))
+    
+    def _send_stream(self, request, reply, prompt_tokens):
+        # Server-sent events of a few characters each, then the usage and [DONE]
+        chunk = {"id": f"chatcmpl-bench{random.randrange(10**9)}", "object": "chat.completion.chunk", "created": int(time.time()), "model": request.get("model", "bench")}
+        events = [
+            dict(chunk, choices=[{"index": 0, "delta": {"content": reply[i:i + 16]}, "finish_reason": None}])
+            for i in range(0, len(reply), 16)
+        ]
+        events.append(dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            events.append(dict(chunk, choices=[], usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(reply) // 4,
+                "total_tokens": prompt_tokens + len(reply) // 4
+            }))
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        self._send(200, body, "text/event-stream")
+    
+    def _reply(self, prompt, structured):
+        replies = self.server.replies
+        if structured:
+            return json.dumps(replies["recipe"])
+        if "How many steps" in prompt:
+            return replies["number_of_steps"]
+        
+        step = re.search(r"Only complete step (\d+)", prompt)
+        if "Extract the complete recipe" in prompt:
+            data = replies["recipe"]
+        elif "one entry to 'steps'" in prompt:
+            data = {"steps": replies["steps"]}
+        elif step:
+            steps = replies["steps"]
+            data = steps[(int(step.group(1)) - 1) % len(steps)]
+        elif "nutrition" in prompt:
+            data = replies["nutrition"]
+        elif "'servings'" in prompt:
+            data = replies["servings"]
+        elif "working_time" in prompt:
+            data = replies["timing"]
+        elif "'keywords'" in prompt:
+            data = replies["tandoor_name"]
+        else:
+            return "OK"
+        return f"Here you go:\n```json\n{json.dumps(data, ensure_ascii=False)}\n```"
+
+class RecipeAPIHandler(_Handler):
+    """
+    Fake Tandoor and Mealie APIs: accepts recipes and images and counts them.
+    """
+    
+    def do_POST(self):
+        self._read_body()
+        _sleep(self.server)
+        if self.path == "/api/recipe/":
+            return self._send(201, json.dumps({"id": self.server.next_id()}))
+        if self.path == "/api/recipes/create/html-or-json":
+            return self._send(201, json.dumps(f"bench-recipe-{self.server.next_id()}"))
+        self._send(404, json.dumps({"detail": "Not found"}))
+    
+    def do_PUT(self):
+        self._read_body()
+        _sleep(self.server)
+        if re.fullmatch(r"/api/recipe/\d+/image/", self.path) or re.fullmatch(r"/api/recipes/[^/]+/image", self.path):
+            with self.server.lock:
+                self.server.images += 1
+            return self._send(200, json.dumps({}))
+        self._send(404, json.dumps({"detail": "Not found"}))
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def __init__(self, handler, latency=0.0, jitter=0.2):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.recipes = 0
+        self.images = 0
+    
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+    
+    def next_id(self):
+        with self.lock:
+            self.recipes += 1
+            return self.recipes
+    
+    def start(self):
+        threading.Thread(target=self.serve_forever, name=f"fake-{self.RequestHandlerClass.__name__}", daemon=True).start()
+        return self
+
+def _make_thumbnail():
+    image = Image.new("RGB", (720, 1280), (200, 80, 40))
+    output = BytesIO()
+    image.save(output, "JPEG", quality=85)
+    return output.getvalue()
+
+def start_social_proxy(latency=0.0):
+    """
+    Start the server serving the post fixtures, to use as HTTP_PROXY.
+    
+    Args:
+        latency (float, optional): Seconds added to every response. Defaults to 0.
+    
+    Returns:
+        FakeServer: The running server.
+    """
+    server = FakeServer(SocialProxyHandler, latency)
+    server.instagram = load_fixture("instagram_post.html")
+    server.tiktok = load_fixture("tiktok_post.html")
+    server.thumbnail = _make_thumbnail()
+    return server.start()
+
+def start_openai(latency=0.0):
+    """
+    Start the fake OpenAI API, to use as OPENAI_BASE_URL (with /v1).
+    
+    Args:
+        latency (float, optional): Seconds added to every completion. Defaults to 0.
+    
+    Returns:
+        FakeServer: The running server.
+    """
+    server = FakeServer(OpenAIHandler, latency)
+    server.replies = json.loads(load_fixture("llm_replies.json"))
+    return server.start()
+
+def start_recipe_api(latency=0.0):
+    """
+    Start the fake Tandoor and Mealie API, to use as BASE_URL_TANDOOR and BASE_URL_MEALIE.
+    
+    Args:
+        latency (float, optional): Seconds added to every response. Defaults to 0.
+    
+    Returns:
+        FakeServer: The running server.
+    """
+    return FakeServer(RecipeAPIHandler, latency).start()
@@ -0,0 +1,117 @@
+"""
+Microbenchmark of the caption extraction on the post fixtures.
+
+Compares parse_post_html with the previous implementation, which built the
+whole BeautifulSoup tree of the page, and checks that both return the same
+caption and thumbnail URL.
+
+Usage (from the repository root):
+    python -m benchmarks.parse_html --repeat 20
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from benchmarks.fake_servers import load_fixture
+from scrapers.social_scraper import parse_post_html
+
+def parse_post_html_full_tree(source, platform, embedded=False):
+    """The caption extraction before the targeted parser, used as reference"""
+    data = BeautifulSoup(source, 'html.parser')
+    
+    def meta_content(**attrs):
+        meta = data.find('meta', attrs=attrs)
+        return meta.get('content') if meta and meta.get('content') else None
+    
+    caption = None
+    if platform == "instagram":
+        content = meta_content(name='description')
+        if content and len(content.split('"')) >= 2:
+            caption = content.split('"')[1]
+        if not caption and embedded:
+            for script in data.find_all('script', attrs={'type': 'application/ld+json'}):
+                try:
+                    entries = json.loads(script.string or "")
+                except ValueError:
+                    continue
+                for entry in entries if isinstance(entries, list) else [entries]:
+                    if isinstance(entry, dict) and (entry.get('caption') or entry.get('articleBody')):
+                        caption = entry.get('caption') or entry.get('articleBody')
+                        break
+                if caption:
+                    break
+    else:
+        for picture in data.find_all('picture'):
+            img = picture.find('img')
+            if img and img.get('alt'):
+                caption = img.get('alt')
+                break
+        if not caption and embedded:
+            script = data.find('script', attrs={'id': '__UNIVERSAL_DATA_FOR_REHYDRATION__'})
+            if script and script.string:
+                try:
+                    state = json.loads(script.string)
+                    caption = state["__DEFAULT_SCOPE__"]["webapp.video-detail"]["itemInfo"]["itemStruct"].get('desc') or None
+                except (ValueError, KeyError, TypeError):
+                    caption = None
+    return caption, meta_content(property='og:image')
+
+def measure(function, source, platform, embedded, repeat):
+    """
+    Returns:
+        tuple: (result, median seconds, peak traced memory in MB)
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(source, platform, embedded)
+        timings.append(time.perf_counter() - started)
+    
+    # Memory is measured on a separate run, tracing slows the parsing down
+    tracemalloc.start()
+    function(source, platform, embedded)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, sorted(timings)[len(timings) // 2], peak / (1024 * 1024)
+
+def variants():
+    """(name, platform, embedded, HTML) of every benchmarked page"""
+    instagram = load_fixture("instagram_post.html").replace("{post_id}", "Bench")
+    tiktok = load_fixture("tiktok_post.html").replace("{post_id}", "1")
+    return [
+        ("instagram", "instagram", False, instagram),
+        ("instagram embedded", "instagram", True, instagram),
+        # Without the meta caption, the caption comes from the embedded JSON
+        ("instagram no meta", "instagram", True, instagram.replace('name="description"', 'name="removed"')),
+        ("tiktok", "tiktok", False, tiktok),
+        ("tiktok embedded", "tiktok", True, tiktok),
+        ("tiktok no alt", "tiktok", True, tiktok.replace(' alt="', ' data-alt="')),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark of the caption extraction")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per page and parser")
+    args = parser.parse_args()
+    
+    print(f"{'Page':<22}{'full tree':>12}{'targeted':>12}{'speedup':>9}{'full MB':>10}{'targ. MB':>10}")
+    mismatches = 0
+    for name, platform, embedded, source in variants():
+        before, before_time, before_memory = measure(parse_post_html_full_tree, source, platform, embedded, args.repeat)
+        after, after_time, after_memory = measure(parse_post_html, source, platform, embedded, args.repeat)
+        print(
+            f"{name:<22}{before_time * 1000:>10.2f}ms{after_time * 1000:>10.2f}ms{before_time / after_time:>8.1f}x"
+            f"{before_memory:>10.2f}{after_memory:>10.2f}"
+        )
+        if before != after:
+            mismatches += 1
+            print(f"  Different results: {before!r} != {after!r}")
+    
+    if mismatches:
+        raise SystemExit(f"{mismatches} pages give different results")
+    print("Both parsers return the same captions and thumbnail URLs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Offline end-to-end benchmark of the scraping pipeline.
+
+Posts are served from the fixtures through a local HTTP proxy, and the
+OpenAI, Tandoor and Mealie APIs are replaced by local fake servers, so the
+numbers only depend on this code base and the configured latencies.
+
+Usage (from the repository root):
+    python -m benchmarks.run --scenario all --requests 20 --concurrency 4 --llm-latency 0.5
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_servers import start_openai, start_recipe_api, start_social_proxy
+
+SCENARIOS = ("tandoor", "mealie", "both", "submit")
+
+def configure_environment(args, work_dir):
+    """
+    Start the fake servers and point the application at them.
+    Must run before the application modules are imported.
+    """
+    social = start_social_proxy(args.social_latency)
+    openai = start_openai(args.llm_latency)
+    recipe_api = start_recipe_api(args.api_latency)
+    
+    os.environ.update({
+        # Post pages go through the fixture proxy, local servers are reached directly
+        "HTTP_PROXY": social.url,
+        "http_proxy": social.url,
+        "NO_PROXY": "127.0.0.1,localhost",
+        "no_proxy": "127.0.0.1,localhost",
+        "OPENAI_BASE_URL": f"{openai.url}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "LOCAL_LLM_BASE_URL": f"{openai.url}/v1",
+        # Duck.ai can't be reproduced offline, both targets use an OpenAI compatible backend
+        "LLM_BACKEND": args.backend,
+        "BASE_URL_TANDOOR": recipe_api.url,
+        "TOKEN_TANDOOR": "benchmark",
+        "BASE_URL_MEALIE": recipe_api.url,
+        "TOKEN_MEALIE": "benchmark",
+        "SCRAPER_FAST_PATH": "true",
+        "BROWSER_POOL_WARM": "false",
+        "LLM_CACHE_PATH": os.path.join(work_dir, "llm_cache.db"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'app.db')}",
+        "DB_SECRET": "benchmark",
+        "WORKER_COUNT": str(args.concurrency),
+        "JOB_QUEUE_SIZE": str(max(args.requests, 1)),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+    return recipe_api
+
+def make_urls(count, platform):
+    """Unique post URLs, so the LLM cache never answers"""
+    token = random.randrange(10**6)
+    urls = []
+    for i in range(count):
+        post_platform = platform if platform != "both" else ("instagram", "tiktok")[i % 2]
+        if post_platform == "instagram":
+            urls.append((f"http://www.instagram.com/p/Bench{token}x{i}/", "instagram"))
+        else:
+            urls.append((f"http://www.tiktok.com/@bench_chef/video/{token * 10**6 + i}", "tiktok"))
+    return urls
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_direct(scenario, urls, concurrency):
+    """
+    Call the scrape function of the scenario for every URL.
+    
+    Returns:
+        list: (latency, error, stage durations) of every request.
+    """
+    from main import get_scrape_function, is_error_result
+    from scrapers.tracing import start_trace
+    
+    scrape = get_scrape_function(scenario)
+    
+    def process(item):
+        url, platform = item
+        error = None
+        started = time.perf_counter()
+        with start_trace() as trace:
+            try:
+                if is_error_result(scrape(url, platform)):
+                    error = "API error"
+            except Exception as e:
+                error = str(e)
+        return time.perf_counter() - started, error, trace.durations()
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(process, urls))
+
+def run_submit(urls, target, timeout):
+    """
+    Submit every URL through the web app and wait for the jobs to finish.
+    The jobs run on the app's own workers (WORKER_COUNT = concurrency).
+    
+    Returns:
+        list: (latency, error, stage durations) of every job.
+    """
+    from app import app
+    from models import JobStage
+    
+    client = app.test_client()
+    submitted = []
+    for url, platform in urls:
+        started = time.perf_counter()
+        response = client.post("/submit", data={"url": url, "platform": platform, "target": target, "force": "on"})
+        if response.status_code == 302:
+            submitted.append((response.headers["Location"].rstrip("/").rsplit("/", 1)[-1], started))
+        else:
+            submitted.append((None, started))
+    
+    # Poll the job status API like the job page does
+    results = {}
+    deadline = time.perf_counter() + timeout
+    while len(results) < len(submitted) and time.perf_counter() < deadline:
+        for index, (job_id, started) in enumerate(submitted):
+            if index in results:
+                continue
+            if job_id is None:
+                results[index] = (0.0, "rejected")
+                continue
+            status = client.get(f"/api/job/{job_id}").get_json()["status"]
+            if status in ("completed", "failed"):
+                results[index] = (time.perf_counter() - started, None if status == "completed" else "failed")
+        time.sleep(0.05)
+    
+    outcomes = []
+    with app.app_context():
+        for index, (job_id, started) in enumerate(submitted):
+            latency, error = results.get(index, (time.perf_counter() - started, "timeout"))
+            durations = {}
+            for stage in JobStage.query.filter_by(job_id=job_id) if job_id else []:
+                durations[stage.name] = durations.get(stage.name, 0) + stage.duration
+            outcomes.append((latency, error, durations))
+    return outcomes
+
+def report(name, outcomes, elapsed):
+    """Print the summary of a scenario and return it"""
+    from scrapers.tracing import percentile
+    
+    latencies = [latency for latency, _, _ in outcomes]
+    errors = [error for _, error, _ in outcomes if error]
+    summary = {
+        "scenario": name,
+        "requests": len(outcomes),
+        "errors": len(errors),
+        "elapsed": elapsed,
+        "throughput_per_min": len(outcomes) / elapsed * 60 if elapsed > 0 else 0,
+        "p50": percentile(latencies, 50) if latencies else None,
+        "p95": percentile(latencies, 95) if latencies else None,
+        "p99": percentile(latencies, 99) if latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {},
+    }
+    
+    stages = {}
+    for _, _, durations in outcomes:
+        for stage, duration in durations.items():
+            stages.setdefault(stage, []).append(duration)
+    for stage, durations in stages.items():
+        summary["stages"][stage] = {"p50": percentile(durations, 50), "p95": percentile(durations, 95)}
+    
+    print(f"\n== {name}: {summary['requests']} requests in {elapsed:.1f}s, {summary['errors']} errors")
+    print(f"Throughput: {summary['throughput_per_min']:.1f} recipes/min")
+    if latencies:
+        print(f"Latency: p50 {summary['p50']:.2f}s  p95 {summary['p95']:.2f}s  p99 {summary['p99']:.2f}s")
+    print(f"Peak RSS (process so far): {summary['peak_rss_mb']:.0f} MB")
+    if errors:
+        print(f"First error: {errors[0]}")
+    if stages:
+        print(f"{'Stage':<32}{'p50':>9}{'p95':>9}")
+        for stage, values in sorted(summary["stages"].items(), key=lambda item: -item[1]["p50"]):
+            print(f"{stage:<32}{values['p50']:>8.3f}s{values['p95']:>8.3f}s")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the scraping pipeline")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all", help="What to benchmark")
+    parser.add_argument("--requests", type=int, default=20, help="Number of posts per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of posts processed at the same time")
+    parser.add_argument("--platform", choices=("instagram", "tiktok", "both"), default="both", help="Platform of the posts")
+    parser.add_argument("--target", choices=("tandoor", "mealie", "both"), default="tandoor", help="Target of the submit scenario")
+    parser.add_argument("--backend", choices=("openai", "local"), default="openai", help="LLM backend talking to the fake OpenAI server")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per fake LLM completion")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Seconds per fake Tandoor/Mealie request")
+    parser.add_argument("--social-latency", type=float, default=0.1, help="Seconds per fake post page or image")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for the submitted jobs")
+    parser.add_argument("--output", type=str, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+    
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    recipe_api = configure_environment(args, work_dir)
+    
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    summaries = []
+    for scenario in scenarios:
+        urls = make_urls(args.requests, args.platform)
+        started = time.perf_counter()
+        if scenario == "submit":
+            outcomes = run_submit(urls, args.target, args.timeout)
+        else:
+            outcomes = run_direct(scenario, urls, args.concurrency)
+        summaries.append(report(scenario, outcomes, time.perf_counter() - started))
+    
+    print(f"\nFake recipe API received {recipe_api.recipes} recipes and {recipe_api.images} images")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"settings": vars(args), "results": summaries}, output, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,26 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get('DB_SECRET')
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///app.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Job scheduling
+    WORKER_COUNT = int(os.environ.get('WORKER_COUNT', 2))
+    JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 20))
+    # Seconds between two writes of the job progress to the database
+    JOB_STATE_FLUSH_INTERVAL = float(os.environ.get('JOB_STATE_FLUSH_INTERVAL', 2))
+    # Run the jobs in the web app, false when they are run by standalone workers (python -m workers)
+    EMBEDDED_WORKERS = os.environ.get('EMBEDDED_WORKERS', 'true').lower() == 'true'
+    # Seconds between two looks for new jobs of an idle standalone worker
+    WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 2))
+    # Port of the Prometheus metrics of a standalone worker, 0 to disable
+    WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', 9100))
+
+    # Job leases and retries
+    # Seconds a worker owns a job without renewing its lease
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 60))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    # Seconds before the first retry, doubled for every attempt
+    JOB_RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF', 30))
+    # Seconds between two renewals of the leases and looks for expired leases and due jobs
+    JOB_SWEEP_INTERVAL = float(os.environ.get('JOB_SWEEP_INTERVAL', 15))
\ No newline at end of file
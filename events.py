@@ -0,0 +1,60 @@
+import queue
+import threading
+from collections import defaultdict
+
+class JobEvents:
+    """
+    In-process publish/subscribe of job status updates, used to push
+    progress to the job page instead of having it poll the database.
+    """
+    
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+    
+    def subscribe(self, job_id):
+        """
+        Subscribe to the updates of a job.
+        
+        Args:
+            job_id (str): The ID of the job.
+            
+        Returns:
+            queue.Queue: Queue receiving the status updates of the job.
+        """
+        subscription = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers[job_id].add(subscription)
+        return subscription
+    
+    def unsubscribe(self, job_id, subscription):
+        """Stop receiving the updates of a job"""
+        with self._lock:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[job_id]
+    
+    def has_subscribers(self, job_id):
+        """Whether anybody listens to the updates of a job"""
+        return job_id in self._subscribers
+    
+    def publish(self, job_id, data):
+        """
+        Send a status update to every subscriber of a job.
+        
+        Args:
+            job_id (str): The ID of the job.
+            data (dict): The status update.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(data)
+            except queue.Full:
+                # Slow subscriber, it will catch up with the next update
+                pass
+
+job_events = JobEvents()
@@ -0,0 +1,136 @@
+import atexit
+import threading
+import time
+
+from events import job_events
+from logs import setup_logging
+from models import db, Job
+
+logger = setup_logging("job_store")
+
+TERMINAL_STATUSES = ('completed', 'failed')
+# The job leaves this process: finished, or back in the database waiting for a retry
+RELEASED_STATUSES = TERMINAL_STATUSES + ('pending',)
+
+class JobStateStore:
+    """
+    In-memory state of the running jobs. Status reads are served from memory,
+    progress updates are written to the database in batches and terminal
+    states (completed / failed) or jobs put back to pending for a retry are
+    written right away.
+    """
+    
+    def __init__(self):
+        self._states = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._app = None
+    
+    def init_app(self, app):
+        """
+        Start flushing the pending updates to the database of the app.
+        
+        Args:
+            app (Flask): The Flask application.
+        """
+        if self._app is not None:
+            return
+        self._app = app
+        interval = app.config.get('JOB_STATE_FLUSH_INTERVAL', 2)
+        threading.Thread(
+            target=self._run_flusher,
+            args=(interval,),
+            name="job-state-flusher",
+            daemon=True
+        ).start()
+        atexit.register(self.flush)
+    
+    def update(self, job_id, **fields):
+        """
+        Update the state of a job.
+        
+        Args:
+            job_id (str): The ID of the job.
+            **fields: The Job columns to update.
+        """
+        with self._lock:
+            state = self._states.setdefault(job_id, {})
+            state.update(fields)
+            self._dirty.add(job_id)
+            snapshot = dict(state)
+        
+        job_events.publish(job_id, {
+            'status': snapshot.get('status'),
+            'progress': snapshot.get('progress'),
+            'message': snapshot.get('message'),
+            'queue_position': None,
+            'result_url': snapshot.get('result_url') if snapshot.get('status') == 'completed' else None
+        })
+        
+        if snapshot.get('status') in RELEASED_STATUSES:
+            self.flush([job_id])
+            with self._lock:
+                if job_id not in self._dirty:
+                    self._states.pop(job_id, None)
+    
+    def get(self, job_id):
+        """
+        Get the state of a job that was not written to the database yet.
+        
+        Args:
+            job_id (str): The ID of the job.
+        
+        Returns:
+            dict or None: The updated Job columns, None if the job is not in memory.
+        """
+        with self._lock:
+            state = self._states.get(job_id)
+            return dict(state) if state is not None else None
+    
+    def flush(self, job_ids=None):
+        """
+        Write the pending updates to the database in a single transaction.
+        
+        Args:
+            job_ids (list, optional): Only flush these jobs. Defaults to all jobs.
+        """
+        if self._app is None:
+            return
+        
+        # Only one flush at a time, so an older batch can't overwrite a newer one
+        with self._flush_lock:
+            with self._lock:
+                ids = self._dirty if job_ids is None else self._dirty.intersection(job_ids)
+                pending = {job_id: dict(self._states[job_id]) for job_id in ids}
+                self._dirty.difference_update(pending)
+            if not pending:
+                return
+            
+            try:
+                with self._app.app_context():
+                    for job_id, fields in pending.items():
+                        job = db.session.get(Job, job_id)
+                        if job:
+                            for key, value in fields.items():
+                                setattr(job, key, value)
+                    db.session.commit()
+            except Exception as e:
+                logger.error(f"Failed to write job states: {e}", exc_info=True)
+                with self._lock:
+                    self._dirty.update(pending)
+                return
+            
+            # Forget the jobs that finished in the meantime
+            with self._lock:
+                for job_id in pending:
+                    state = self._states.get(job_id)
+                    if state and job_id not in self._dirty and state.get('status') in RELEASED_STATUSES:
+                        del self._states[job_id]
+    
+    def _run_flusher(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+job_store = JobStateStore()
@@ -1,8 +1,18 @@
 import argparse
+import functools
+import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
 from scrapers.scrape_for_mealie import scrape_recipe_for_mealie
 from scrapers.scrape_for_tandoor import scrape_recipe_for_tandoor
+from scrapers.scrape_for_targets import TARGETS, scrape_recipe_for_targets
+from scrapers.tracing import percentile, start_trace
+from urls import detect_platform
 
 load_dotenv()
 
@@ -21,36 +31,163 @@ def is_valid_url(url, platform):
             url_pattern = re.compile(r'^(https?:\/\/)?(www\.)?instagram\.com\/[A-Za-z0-9_\-\/]+\/?(\?.*)?$')
         case "tiktok" | "t":
             url_pattern = re.compile(r'^(https?:\/\/)?(www\.)?tiktok\.com\/@?[A-Za-z0-9_\-\/]+\/video\/[0-9]+(\?.*)?$')
-            
+        case _:
+            return False
+    
     return re.match(url_pattern, url) is not None
+
+def get_scrape_function(mode):
+    """
+    Get the scraping function for the given mode.
+    Raises:
+        ValueError: If the mode is not 'mealie'/'m', 'tandoor'/'t' or 'both'/'b'.
+    """
+    if mode == 'mealie' or mode == 'm':
+        return scrape_recipe_for_mealie
+    elif mode == 'tandoor' or mode == 't':
+        return scrape_recipe_for_tandoor
+    elif mode == 'both' or mode == 'b':
+        return functools.partial(scrape_recipe_for_targets, targets=TARGETS['both'])
+    else:
+        raise ValueError("Invalid mode. Please specify either 'mealie'/'m', 'tandoor'/'t' or 'both'/'b'")
+
+def is_error_result(result):
+    """Check if a scraping result reports an API error"""
+    if not isinstance(result, dict):
+        return False
+    nested = result.get('result')
+    return result.get('status') == 'error' or (isinstance(nested, dict) and nested.get('status') == 'error')
+
+def load_manifest(manifest_path):
+    """
+    Read the URLs already processed successfully from a manifest.
+    Returns:
+        set: The successfully processed URLs.
+    """
+    done = set()
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path) as manifest:
+        for line in manifest:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Line cut by an interrupted run
+                continue
+            if entry.get('status') == 'success':
+                done.add(entry['url'])
+    return done
+
+def bulk_import(input_path, mode, platform, parallel, manifest_path, backend=None):
+    """
+    Import every URL of a file, resuming from the manifest of a previous run.
+    Args:
+        input_path (str): File with one URL per line.
+        mode (str): The mode of the recipe extraction ('mealie'/'m', 'tandoor'/'t' or 'both'/'b').
+        platform (str): The platform of the URLs, detected from each URL if None.
+        parallel (int): Number of URLs processed at the same time.
+        manifest_path (str): JSONL file receiving the outcome of every URL.
+        backend (str, optional): Name of the LLM backend.
+    """
+    scrape = get_scrape_function(mode)
+    
+    with open(input_path) as input_file:
+        urls = [line.strip() for line in input_file if line.strip() and not line.startswith('#')]
+    urls = list(dict.fromkeys(urls))
+    
+    done = load_manifest(manifest_path)
+    pending = [url for url in urls if url not in done]
+    print(f"{len(urls)} URLs, {len(urls) - len(pending)} already imported, {len(pending)} to process")
+    
+    manifest_lock = threading.Lock()
+    outcomes = []
+    
+    def process(url):
+        url_platform = platform or detect_platform(url)
+        entry = {'url': url, 'platform': url_platform, 'mode': mode}
+        started = time.perf_counter()
+        with start_trace() as trace:
+            try:
+                if not is_valid_url(url, url_platform):
+                    raise ValueError("Invalid URL")
+                result = scrape(url, url_platform, backend=backend)
+                entry['status'] = 'error' if is_error_result(result) else 'success'
+                entry['result'] = result
+            except Exception as e:
+                entry['status'] = 'error'
+                entry['error'] = str(e)
+        entry['duration'] = time.perf_counter() - started
+        entry['stages'] = trace.durations()
+        entry['finished_at'] = datetime.now().isoformat()
+        
+        with manifest_lock:
+            with open(manifest_path, 'a') as manifest:
+                manifest.write(json.dumps(entry, default=str) + '\n')
+            outcomes.append(entry)
+            print(f"[{len(outcomes)}/{len(pending)}] {entry['status']}: {url}")
     
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        list(executor.map(process, pending))
+    elapsed = time.perf_counter() - started
+    
+    succeeded = sum(1 for entry in outcomes if entry['status'] == 'success')
+    print(f"\nProcessed {len(outcomes)} URLs in {elapsed:.1f}s: {succeeded} succeeded, {len(outcomes) - succeeded} failed")
+    if elapsed > 0:
+        print(f"Throughput: {len(outcomes) / elapsed * 60:.1f} URLs/min")
+    
+    stages = {}
+    for entry in outcomes:
+        for name, duration in entry['stages'].items():
+            stages.setdefault(name, []).append(duration)
+    if stages:
+        print(f"\n{'Stage':<25}{'Count':>7}{'Mean':>9}{'p50':>9}{'p95':>9}{'Total':>10}")
+        for name, durations in sorted(stages.items(), key=lambda item: -sum(item[1])):
+            print(
+                f"{name:<25}{len(durations):>7}{sum(durations) / len(durations):>8.2f}s"
+                f"{percentile(durations, 50):>8.2f}s{percentile(durations, 95):>8.2f}s{sum(durations):>9.1f}s"
+            )
+
 def main():
     """
     Main function to extract recipe information from an Instagram post.
     This function uses argparse to parse command-line arguments for the URL of the Instagram post
     and the mode of recipe extraction (either 'mealie' or 'tandoor'). It validates the provided
     Instagram URL and calls the appropriate scraping function based on the specified mode.
+    With -input, every URL of the file is imported (see bulk_import).
     Raises:
-        ValueError: If the provided Instagram URL is invalid or if the mode is not 'mealie'/'m' or 'tandoor'/'t'.
+        ValueError: If the provided Instagram URL is invalid or if the mode is not 'mealie'/'m', 'tandoor'/'t' or 'both'/'b'.
     Command-line Arguments:
         -url (str): The URL of the Instagram post.
-        -mode (str): The mode of the recipe extraction ('mealie'/'m' or 'tandoor'/'t').
+        -mode (str): The mode of the recipe extraction ('mealie'/'m', 'tandoor'/'t' or 'both'/'b').
+        -platform (str): The platform of the URL ('instagram'/'i' or 'tiktok'/'t').
+        -input (str): File with one URL per line, to import many posts.
+        -parallel (int): Number of URLs processed at the same time with -input.
+        -manifest (str): JSONL file recording the outcome of every URL with -input.
+        -backend (str): The LLM backend ('openai', 'duckai' or 'local').
     """
     parser = argparse.ArgumentParser(description='Extract recipe information from an post')
-    parser.add_argument('-url', type=str, required=True, help='The URL of the Instagram post')
-    parser.add_argument('-mode', type=str, required=True, help='The mode of the recipe extraction (mealie or tandoor)')
-    parser.add_argument('-platform', type=str, required=True, help='The platform of the URL (instagram or tiktok)')
+    parser.add_argument('-url', type=str, help='The URL of the Instagram post')
+    parser.add_argument('-mode', type=str, required=True, help='The mode of the recipe extraction (mealie, tandoor or both)')
+    parser.add_argument('-platform', type=str, help='The platform of the URL (instagram or tiktok), detected from the URL with -input')
+    parser.add_argument('-input', type=str, help='A file with one URL per line to import')
+    parser.add_argument('-parallel', type=int, default=1, help='Number of URLs processed at the same time with -input')
+    parser.add_argument('-manifest', type=str, help='JSONL file recording the outcome of every URL (default: <input>.manifest.jsonl)')
+    parser.add_argument('-backend', type=str, help='The LLM backend (openai, duckai or local), defaults to LLM_BACKEND')
     args = parser.parse_args()
     
+    if args.input:
+        get_scrape_function(args.mode)
+        bulk_import(args.input, args.mode, args.platform, args.parallel, args.manifest or f"{args.input}.manifest.jsonl", args.backend)
+        return
+    
+    if not args.url or not args.platform:
+        parser.error("-url and -platform are required without -input")
+    
     if not is_valid_url(args.url, args.platform):
         raise ValueError("Invalid URL. Please provide a valid post URL.")
     
-    if args.mode == 'mealie' or args.mode == 'm':
-        scrape_recipe_for_mealie(args.url, args.platform)
-    elif args.mode == 'tandoor' or args.mode == 't':
-        scrape_recipe_for_tandoor(args.url, args.platform)
-    else:
-        raise ValueError("Invalid mode. Please specify either 'mealie'/'m' or 'tandoor'/'t'")
+    get_scrape_function(args.mode)(args.url, args.platform, backend=args.backend)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
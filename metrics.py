@@ -0,0 +1,106 @@
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest, start_http_server
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Job processing
+QUEUE_DEPTH = Gauge("scraper_queue_depth", "Jobs waiting for a worker")
+ACTIVE_JOBS = Gauge("scraper_active_jobs", "Jobs being processed by a worker")
+LIVE_BROWSERS = Gauge("scraper_live_browsers", "Launched WebDriver instances (idle or leased)")
+JOB_DURATION = Histogram(
+    "scraper_job_duration_seconds",
+    "Time spent processing a job",
+    ["platform", "target"],
+    buckets=(5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+)
+
+# LLM requests
+LLM_LATENCY = Histogram(
+    "scraper_llm_request_duration_seconds",
+    "Latency of the LLM requests (cache hits excluded)",
+    ["model", "outcome"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+)
+LLM_TOKENS = Counter("scraper_llm_tokens_total", "Tokens used by the LLM requests", ["model", "type"])
+LLM_CACHE_LOOKUPS = Counter("scraper_llm_cache_lookups_total", "Lookups in the LLM response cache", ["outcome"])
+
+# Recipe API uploads
+UPLOAD_LATENCY = Histogram(
+    "scraper_upload_duration_seconds",
+    "Latency of the requests to the recipe APIs",
+    ["api", "kind"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+UPLOAD_RESPONSES = Counter(
+    "scraper_upload_responses_total",
+    "Responses of the recipe APIs by status code ('error' when no response was received)",
+    ["api", "kind", "status_code"]
+)
+
+# Database
+DB_COMMIT_LATENCY = Histogram(
+    "scraper_db_commit_duration_seconds",
+    "Time spent flushing and committing database sessions",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+@event.listens_for(Session, "before_commit")
+def _start_commit_timer(session):
+    session.info["commit_started"] = time.perf_counter()
+
+@event.listens_for(Session, "after_commit")
+def _observe_commit(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_LATENCY.observe(time.perf_counter() - started)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_commit_timer(session, previous_transaction):
+    session.info.pop("commit_started", None)
+
+def track_scheduler(scheduler, browser_pool):
+    """
+    Read the queue depth and the number of live browsers when metrics are collected.
+    
+    Args:
+        scheduler (JobScheduler): The job scheduler.
+        browser_pool (BrowserPool): The browser pool.
+    """
+    QUEUE_DEPTH.set_function(scheduler.queue_depth)
+    LIVE_BROWSERS.set_function(lambda: browser_pool.live_count)
+
+def track_job_table(queue_depth):
+    """
+    Metrics of a web app whose jobs are run by standalone workers. The queue
+    depth is read from the job table, the active jobs and live browsers are
+    only reported by the workers.
+    
+    Args:
+        queue_depth (callable): Returns the number of jobs waiting in the job table.
+    """
+    QUEUE_DEPTH.set_function(queue_depth)
+    for gauge in (ACTIVE_JOBS, LIVE_BROWSERS):
+        REGISTRY.unregister(gauge)
+
+def serve_worker_metrics(port, browser_pool):
+    """
+    Expose the metrics of a standalone worker on their own HTTP port. The
+    queue depth is left to the web app.
+    
+    Args:
+        port (int): The port of the metrics endpoint.
+        browser_pool (BrowserPool): The browser pool.
+    """
+    LIVE_BROWSERS.set_function(lambda: browser_pool.live_count)
+    REGISTRY.unregister(QUEUE_DEPTH)
+    start_http_server(port)
+
+def render():
+    """
+    Render the metrics in the Prometheus text format.
+    
+    Returns:
+        tuple: (body, content type)
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
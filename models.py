@@ -6,15 +6,62 @@ db = SQLAlchemy()
 class Job(db.Model):
     id = db.Column(db.String(36), primary_key=True)
     url = db.Column(db.String(512), nullable=False)
+    canonical_url = db.Column(db.String(512), index=True)
     platform = db.Column(db.String(50), nullable=False)
     target = db.Column(db.String(50), nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, processing, completed, failed
     progress = db.Column(db.Integer, default=0)
     message = db.Column(db.String(512))
     result = db.Column(db.Text)
     result_url = db.Column(db.String(512))
-    created_at = db.Column(db.DateTime, default=datetime.now)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
     completed_at = db.Column(db.DateTime)
+    bypass_cache = db.Column(db.Boolean, default=False)
+    llm_backend = db.Column(db.String(20))  # None: LLM_BACKEND or the default of the target
+    # Lease of the worker processing the job, expired leases are reclaimed
+    claimed_by = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime, index=True)
+    # Automatic retries, pending jobs are not picked up before next_attempt_at
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer)  # None: JOB_MAX_ATTEMPTS
+    next_attempt_at = db.Column(db.DateTime, index=True)
+    # Targets the recipe was already sent to (comma separated), skipped by the retries
+    completed_targets = db.Column(db.String(50))
     
     def __repr__(self):
-        return f'<Job {self.id}>'
\ No newline at end of file
+        return f'<Job {self.id}>'
+
+class JobStage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), db.ForeignKey('job.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    ended_at = db.Column(db.DateTime, nullable=False)
+    duration = db.Column(db.Float, nullable=False)  # seconds
+    outcome = db.Column(db.String(20), nullable=False)  # ok, error
+    error = db.Column(db.String(512))
+    
+    def __repr__(self):
+        return f'<JobStage {self.job_id} {self.name}>'
+
+def upgrade_schema():
+    """
+    Add the columns and indexes missing from an existing database.
+    db.create_all() only creates missing tables.
+    """
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
\ No newline at end of file
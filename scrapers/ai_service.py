@@ -1,8 +1,8 @@
 import json
 import os
 import re
-from bs4 import BeautifulSoup
 from logs import setup_logging
+from scrapers.tracing import traced
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
@@ -10,6 +10,97 @@ from selenium.webdriver.support.ui import WebDriverWait
 
 logger = setup_logging("duck_ai")
 
+# Seconds to wait for Duck.ai to finish a response
+RESPONSE_TIMEOUT = float(os.getenv("DUCKAI_RESPONSE_TIMEOUT", 60))
+
+# Messages of the assistant in the conversation
+_RESPONSE_SELECTOR = "div.VrBPSncUavA1d7C9kAc5"
+
+# Resolves once the response is complete: the prompt textarea is enabled again and
+# the stop button is gone. Driven by DOM mutations instead of polling from Selenium.
+# The page may not switch to busy right after the prompt is sent, so the wait only
+# succeeds once the generation was seen running, or once a new response appeared
+# and the page stayed idle for a short while. Resolves false on timeout.
+_WAIT_FOR_RESPONSE_SCRIPT = """
+const timeoutMs = arguments[0];
+const responseSelector = arguments[1];
+const responsesBefore = arguments[2];
+const done = arguments[arguments.length - 1];
+let sawBusy = false;
+let settleTimer = null;
+let finished = false;
+
+function isBusy() {
+    const textarea = document.querySelector("textarea[name='user-prompt']");
+    return !textarea || textarea.disabled || document.querySelector("button rect[width='10'][height='10']") !== null;
+}
+
+function finish(result) {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(settleTimer);
+    clearTimeout(timeoutTimer);
+    done(result);
+}
+
+function check() {
+    clearTimeout(settleTimer);
+    if (isBusy()) {
+        sawBusy = true;
+    } else if (sawBusy) {
+        finish(true);
+    } else if (document.querySelectorAll(responseSelector).length > responsesBefore) {
+        settleTimer = setTimeout(() => finish(true), 500);
+    }
+}
+
+const observer = new MutationObserver(check);
+observer.observe(document.body, {childList: true, subtree: true, characterData: true, attributes: true, attributeFilter: ["disabled"]});
+const timeoutTimer = setTimeout(() => finish(false), timeoutMs);
+check();
+"""
+
+# Number of JSON code blocks in the conversation, to know if the last response added one
+_COUNT_CODE_BLOCKS_SCRIPT = "return document.querySelectorAll('code.language-json').length;"
+
+# Number of elements matching a selector, to know if a new response was added
+_COUNT_SCRIPT = "return document.querySelectorAll(arguments[0]).length;"
+
+# Text of the last response and its JSON code block (if the response has one)
+_LAST_RESPONSE_SCRIPT = """
+const codeBlocksBefore = arguments[0];
+const responses = document.querySelectorAll(arguments[1]);
+const last = responses.length ? responses[responses.length - 1] : null;
+const paragraph = last ? last.querySelector("p") : null;
+const codeBlocks = document.querySelectorAll("code.language-json");
+return {
+    text: paragraph ? paragraph.textContent : (last ? last.textContent : null),
+    json: codeBlocks.length > codeBlocksBefore ? codeBlocks[codeBlocks.length - 1].textContent : null
+};
+"""
+
+def _count_responses(browser):
+    """Number of responses in the conversation, read before sending a prompt"""
+    return browser.execute_script(_COUNT_SCRIPT, _RESPONSE_SELECTOR)
+
+def _wait_for_response(browser, responses_before):
+    """
+    Wait until Duck.ai finished responding.
+    
+    Args:
+        browser (WebDriver): The browser window object.
+        responses_before (int): Number of responses before the prompt was sent.
+    
+    Returns:
+        bool: True if the response is complete, False on timeout.
+    """
+    browser.set_script_timeout(RESPONSE_TIMEOUT + 5)
+    return browser.execute_async_script(
+        _WAIT_FOR_RESPONSE_SCRIPT, int(RESPONSE_TIMEOUT * 1000), _RESPONSE_SELECTOR, responses_before
+    )
+
+@traced("initialize_chat")
 def initialize_chat(browser, caption):
     """
     Initialize a chat with Duck.ai by providing the recipe caption as context.
@@ -31,12 +122,13 @@ def initialize_chat(browser, caption):
         
         # Set up context for all future interactions
         context_prompt = f"I'm going to ask you questions about this recipe. Please use this recipe information as context for all your responses: {caption}"
+        responses_before = _count_responses(browser)
         textarea.send_keys(context_prompt)
         textarea.send_keys(Keys.RETURN)
         
         # Wait for the response to complete
-        WebDriverWait(browser, 60).until(EC.presence_of_element_located((By.XPATH, "//button[@type='submit' and @disabled]")))
-        WebDriverWait(browser, 60).until_not(EC.presence_of_element_located((By.XPATH, "//button//rect[@width='10' and @height='10']")))
+        if not _wait_for_response(browser, responses_before):
+            raise TimeoutError("Duck.ai did not finish responding")
         
         logger.info("Chat initialized successfully with recipe context")
         return True
@@ -47,28 +139,29 @@ def initialize_chat(browser, caption):
 
 def send_raw_prompt(browser, prompt):
     """
-    Send a prompt to Duck.ai and get the raw HTML response.
+    Send a prompt to Duck.ai and get the response.
     Basic low-level function used by other functions.
     
+    Only the last response is read from the page, so the cost of a prompt
+    doesn't grow with the length of the conversation.
+    
     Args:
         browser (WebDriver): The browser window object.
         prompt (str): The prompt text to send.
     
     Returns:
-        str or None: The raw HTML response if successful, otherwise None.
+        dict or None: The response text ("text") and its JSON code block ("json", None if
+            the response has none) if successful, otherwise None.
     """
     logger.info(f"Sending raw prompt: {prompt[:50]}...")
     
     try:
-        # Wait for the textarea and enter the prompt
-        textarea = WebDriverWait(browser, 15).until(
-            EC.presence_of_element_located((By.XPATH, "//textarea[@name='user-prompt']"))
-        )
-        
         # Wait for the textarea to be enabled
-        WebDriverWait(browser, 15).until(
+        textarea = WebDriverWait(browser, 15).until(
             EC.element_to_be_clickable((By.XPATH, "//textarea[@name='user-prompt']"))
         )
+        code_blocks_before = browser.execute_script(_COUNT_CODE_BLOCKS_SCRIPT)
+        responses_before = _count_responses(browser)
         
         # Clear any existing text
         textarea.clear()
@@ -76,18 +169,16 @@ def send_raw_prompt(browser, prompt):
         # Enter the new prompt
         textarea.send_keys(prompt)
         textarea.send_keys(Keys.RETURN)
-
         
-        # Then wait for it to become enabled again (when generation is complete)
-        WebDriverWait(browser, 60).until(
-            EC.element_to_be_clickable((By.XPATH, "//textarea[@name='user-prompt']"))
-        )
+        # Wait for the response to complete
+        if not _wait_for_response(browser, responses_before):
+            logger.error("Timed out waiting for the response")
+            return None
         
         logger.info("Response generation completed")
         
-        # Get the page source after the response is complete
-        response = browser.page_source
-        return response
+        # Read only the last response
+        return browser.execute_script(_LAST_RESPONSE_SCRIPT, code_blocks_before, _RESPONSE_SELECTOR)
         
     except Exception as e:
         logger.error(f"Failed to send prompt: {e}", exc_info=True)
@@ -95,10 +186,10 @@ def send_raw_prompt(browser, prompt):
 
 def extract_json_from_response(response):
     """
-    Extract JSON from a Duck AI HTML response.
+    Extract JSON from a Duck AI response.
     
     Args:
-        response (str): The HTML response from Duck AI.
+        response (dict): The response returned by send_raw_prompt.
     
     Returns:
         dict or None: Parsed JSON if found, otherwise None.
@@ -107,13 +198,8 @@ def extract_json_from_response(response):
         return None
         
     try:
-        soup = BeautifulSoup(response, 'html.parser')
-        code_blocks = soup.find_all('code', {'class': 'language-json'})
-        
-        if code_blocks:
-            # Get the last (most recent) code block
-            json_response = code_blocks[-1].get_text()
-            return json.loads(json_response)
+        if response.get("json"):
+            return json.loads(response["json"])
         else:
             logger.warning("No JSON code block found in the response")
             return None
@@ -135,6 +221,7 @@ def send_json_prompt(browser, prompt):
     response = send_raw_prompt(browser, prompt)
     return extract_json_from_response(response)
 
+@traced("get_number_of_steps")
 def get_number_of_steps(browser, caption=None):
     """
     Extracts the number of steps from a recipe caption using Duck.ai.
@@ -155,30 +242,18 @@ def get_number_of_steps(browser, caption=None):
         response = send_raw_prompt(browser, prompt)
         
         if response:
-            # Parse the response to extract the step count
-            soup = BeautifulSoup(response, 'html.parser')
-            
-            # Find the response container
-            response_divs = soup.find_all('div', {'class': 'VrBPSncUavA1d7C9kAc5'})
-            if response_divs:
-                # Get the last (most recent) response
-                last_response_div = response_divs[-1]
-                paragraph = last_response_div.find('p')
-                
-                if paragraph:
-                    text = paragraph.get_text().strip()
-                    # Try to extract a number from the text
-                    numbers = re.findall(r'\d+', text)
-                    if numbers:
-                        number_of_steps = int(numbers[0])
-                        logger.info(f"Found {number_of_steps} steps in the recipe")
-                        return number_of_steps
-                    else:
-                        logger.warning(f"No number found in response: {text}")
+            text = (response.get("text") or "").strip()
+            if text:
+                # Try to extract a number from the text
+                numbers = re.findall(r'\d+', text)
+                if numbers:
+                    number_of_steps = int(numbers[0])
+                    logger.info(f"Found {number_of_steps} steps in the recipe")
+                    return number_of_steps
                 else:
-                    logger.warning("No paragraph found in response")
+                    logger.warning(f"No number found in response: {text}")
             else:
-                logger.warning("No response divs found")
+                logger.warning("No response text found")
         
         logger.warning("Could not determine number of steps")
         return None
@@ -187,6 +262,7 @@ def get_number_of_steps(browser, caption=None):
         logger.error(f"Error in get_number_of_steps: {e}", exc_info=True)
         return None
 
+@traced("process_recipe_part")
 def process_recipe_part(browser, part, mode="", step_number=None):
     """
     Process a part of a recipe using Duck AI and get structured data.
@@ -207,6 +283,10 @@ def process_recipe_part(browser, part, mode="", step_number=None):
         if mode == "step" or step_number is not None:
             # Tandoor-style step prompt
             prompt = f"Write your Response in the language {os.getenv('LANGUAGE_CODE', 'en')}. Please fill out this JSON document {part}. Only complete the specified sections. Only complete step {step_number} of the recipe. If the step has more than 3 ingredients, only complete the first 3 and finish the JSON object. The name of the step should be the step number e.g. 'name': '{step_number}.'. Only include the current instruction description in the instruction field. The amount value of the ingredient can only be a whole number or a decimal NOT A FRACTION (convert it to a decimal). If an ingredient has already been mentioned in a previous step, do not include it again as an ingredient in this step. Respond with a JSON code block enclosed in triple backticks (```json)."
+        elif mode == "recipe":
+            prompt = f"Write your Response in the language {os.getenv('LANGUAGE_CODE', 'en')}. Please fill out this JSON document {part}. Extract the complete recipe. Keep the name of the recipe short. Add one entry to 'steps' per instruction of the recipe, the name of the step should be the step number e.g. 'name': '1.'. The amount value of the ingredient can only be a whole number or a decimal NOT A FRACTION (convert it to a decimal). Only list an ingredient in the first step that uses it. Times are in minutes. Respond with a JSON code block enclosed in triple backticks (```json)."
+        elif mode == "steps":
+            prompt = f"Write your Response in the language {os.getenv('LANGUAGE_CODE', 'en')}. Please fill out this JSON document {part}. Add one entry to 'steps' per instruction of the recipe, the name of the step should be the step number e.g. 'name': '1.'. The amount value of the ingredient can only be a whole number or a decimal NOT A FRACTION (convert it to a decimal). Only list an ingredient in the first step that uses it. Respond with a JSON code block enclosed in triple backticks (```json)."
         elif mode == "info":
             prompt = f"Write your Response in the language {os.getenv('LANGUAGE_CODE', 'en')}. Please fill out this JSON document {part} Only fill out author, description, recipeYield, prepTime and cooktime. The cooktime and pretime should have the format e.g. PT1H for one hour or PT15M for 15 Minutes."
         elif mode == "ingredients":
@@ -1,61 +1,291 @@
 import os
 import re
 import json
+import threading
+import time
 from openai import OpenAI
 from logs import setup_logging
+from metrics import LLM_LATENCY, LLM_TOKENS
+from scrapers.json_stream import JsonStream
+from scrapers.llm_cache import llm_cache
+from scrapers.tracing import report_progress, traced
 from dotenv import load_dotenv
 logger = setup_logging("openai_ai")
 load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
-client = OpenAI()
+MODEL = os.getenv("OPENAI_MODEL", "o4-mini")
 
-# Simule une mémoire de conversation pour chaque session de navigateur
-chat_contexts = {}
+# Client créé au premier appel, pour ne pas exiger de clé OpenAI quand un autre backend est utilisé
+_client = None
+_client_lock = threading.Lock()
 
-def get_chat_context(browser_id):
-    return chat_contexts.setdefault(browser_id, [])
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI()
+        return _client
 
-def initialize_chat(browser, caption):
+# Réponses reçues au fil de l'eau : le JSON est vérifié pendant la réception
+STREAM_RESPONSES = os.getenv("LLM_STREAM", "true").lower() == "true"
+
+# Budget de tokens de l'historique envoyé avec chaque prompt (le contexte de la recette n'est jamais retiré)
+HISTORY_TOKEN_BUDGET = int(os.getenv("LLM_HISTORY_TOKEN_BUDGET", 2000))
+
+# Instructions identiques pour toutes les recettes, placées en tête des messages pour profiter du cache de prompt de l'API
+SYSTEM_INSTRUCTIONS = (
+    "You extract recipes from social media posts and answer with JSON when asked. "
+    "I'm going to ask you questions about the recipe below. "
+    "Please use this recipe information as context for all your responses."
+)
+
+def estimate_tokens(messages):
+    """
+    Estime le nombre de tokens d'une liste de messages (environ 4 caractères par token).
+    """
+    return sum(len(str(message["content"])) // 4 + 4 for message in messages)
+
+class Conversation:
     """
-    Initialise une session de conversation avec GPT en fournissant le contexte de la recette.
+    Conversation d'un job avec le LLM.
+    
+    Les messages commencent toujours par le même préfixe (instructions puis
+    légende de la recette), suivi de l'historique des questions et réponses,
+    réduit aux échanges les plus récents au-delà de HISTORY_TOKEN_BUDGET.
+    La conversation appartient au job et disparaît avec lui.
+    """
+    
+    def __init__(self, client=None, model=None):
+        self.client = client
+        self.model = model or MODEL
+        self.caption = None
+        self.use_cache = False
+        self.prefix = []
+        self.history = []
+    
+    def start(self, caption, use_cache=True):
+        """
+        Démarre la conversation sur une nouvelle recette.
+        """
+        self.caption = caption
+        self.use_cache = use_cache
+        self.prefix = [{"role": "system", "content": f"{SYSTEM_INSTRUCTIONS}\n\nRecipe:\n{caption}"}]
+        self.history = []
+    
+    def messages(self, prompt):
+        """
+        Messages à envoyer pour un prompt : préfixe, historique puis prompt.
+        """
+        return self.prefix + self.history + [{"role": "user", "content": prompt}]
+    
+    def add_exchange(self, prompt, reply):
+        """
+        Ajoute une question et sa réponse à l'historique, puis retire les
+        échanges les plus anciens tant que le budget est dépassé.
+        """
+        self.history += [{"role": "user", "content": prompt}, {"role": "assistant", "content": reply}]
+        dropped = 0
+        while len(self.history) > 2 and estimate_tokens(self.history) > HISTORY_TOKEN_BUDGET:
+            del self.history[:2]
+            dropped += 1
+        if dropped:
+            logger.info(f"Dropped {dropped} old exchanges from the conversation history")
+    
+    def fork(self):
+        """
+        Copie indépendante de la conversation, pour envoyer plusieurs prompts en parallèle.
+        Le préfixe est partagé, l'historique est copié.
+        """
+        fork = Conversation(self.client, self.model)
+        fork.caption = self.caption
+        fork.use_cache = self.use_cache
+        fork.prefix = self.prefix
+        fork.history = list(self.history)
+        return fork
+    
+    def close(self):
+        """
+        Libère l'historique de la conversation.
+        """
+        self.prefix = []
+        self.history = []
+
+@traced("initialize_chat")
+def initialize_chat(conversation, caption, use_cache=True):
+    """
+    Initialise une conversation avec GPT en fournissant le contexte de la recette.
+    Si use_cache est faux, les réponses en cache sont ignorées pour cette conversation.
     """
     print("#####USING NATIF#####")
     try:
-        context_prompt = (
-            f"I'm going to ask you questions about this recipe. "
-            f"Please use this recipe information as context for all your responses: {caption}"
-        )
-        browser_id = id(browser)
-        chat_context = get_chat_context(browser_id)
-        chat_context.append({"role": "system", "content": context_prompt})
+        conversation.start(caption, use_cache)
         logger.info("Chat initialized successfully with recipe context")
         return True
     except Exception as e:
         logger.error(f"Failed to initialize chat: {e}", exc_info=True)
         return False
 
-def send_raw_prompt(browser, prompt):
+def fork_chat(conversation):
     """
-    Envoie une requête brute à l'API ChatGPT.
+    Crée une conversation indépendante qui reprend l'historique actuel,
+    pour envoyer plusieurs prompts en parallèle.
     """
+    return conversation.fork()
+
+def end_chat(conversation):
+    """
+    Termine la conversation.
+    """
+    conversation.close()
+
+def _read_stream(response, check):
+    """
+    Lit une réponse en streaming. check (JsonStream ou None) suit le JSON de la
+    réponse : la lecture s'arrête dès qu'il est invalide, ou complet s'il est
+    dans un bloc de code (la suite de la réponse n'est que du texte).
+    Renvoie (réponse, usage, résultat).
+    """
+    parts = []
+    usage = None
     try:
-        browser_id = id(browser)
-        chat_context = get_chat_context(browser_id)
-        chat_context.append({"role": "user", "content": prompt})
-        response = client.chat.completions.create(
-            model="o4-mini",
-            messages=chat_context,
-            temperature=0.2,
+        for chunk in response:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            parts.append(chunk.choices[0].delta.content)
+            if check is None:
+                continue
+            state = check.feed(parts[-1])
+            if state == JsonStream.INVALID:
+                return "".join(parts), usage, "aborted"
+            if state == JsonStream.COMPLETE and check.fenced:
+                return check.text[:check.end] + "\n```", usage, "ok"
+    finally:
+        response.close()
+    return "".join(parts), usage, "ok"
+    
+def _request_completion(conversation, messages, check, **kwargs):
+    """
+    Envoie une requête à l'API et renvoie la réponse, en streaming si STREAM_RESPONSES.
+    """
+    model = conversation.model
+    client = conversation.client or get_client()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        if STREAM_RESPONSES:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.2,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs
+            )
+            reply, usage, outcome = _read_stream(response, check)
+        else:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.2,
+                **kwargs
+            )
+            reply, usage, outcome = response.choices[0].message.content, response.usage, "ok"
+    finally:
+        LLM_LATENCY.labels(model, outcome).observe(time.perf_counter() - started)
+    # Pas d'usage quand la lecture est arrêtée avant la fin
+    if usage:
+        LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens)
+        LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        logger.info(
+            f"Prompt used {usage.prompt_tokens} tokens ({cached_tokens} cached), "
+            f"completion {usage.completion_tokens} tokens"
         )
-        reply = response.choices[0].message.content
-        chat_context.append({"role": "assistant", "content": reply})
+    return reply
+
+def create_completion(conversation, messages, cache_if=None, json_format=None, on_item=None, **kwargs):
+    """
+    Envoie les messages à l'API, en passant par le cache des réponses.
+    cache_if permet de ne garder en cache que les réponses exploitables.
+    json_format ("fenced" pour un bloc ```json, "raw" si toute la réponse est du JSON)
+    indique que la réponse doit contenir du JSON : en streaming, la requête est
+    interrompue et relancée une fois dès que la réponse ne peut plus devenir un JSON valide.
+    on_item(clé, nombre) est appelé à chaque élément reçu d'un tableau de l'objet JSON.
+    """
+    key = None
+    if conversation.use_cache:
+        prompt = json.dumps({"messages": messages, **kwargs}, sort_keys=True)
+        key = llm_cache.make_key(conversation.caption, prompt, conversation.model, os.getenv("LANGUAGE_CODE", "en"))
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+    
+    logger.info(
+        f"Sending {len(messages)} messages, ~{estimate_tokens(messages)} tokens "
+        f"(prefix ~{estimate_tokens(conversation.prefix)}, history ~{estimate_tokens(conversation.history)})"
+    )
+    check_json = STREAM_RESPONSES and json_format is not None
+    for attempt in range(1, 3 if check_json else 2):
+        check = JsonStream(fenced=json_format == "fenced", on_item=on_item) if check_json else None
+        reply = _request_completion(conversation, messages, check, **kwargs)
+        if check is None or check.state != JsonStream.INVALID:
+            break
+        logger.warning(f"Aborted response that can't become valid JSON ({check.error}), attempt {attempt} of 2")
+    else:
+        # Deux réponses invalides : rien à mettre en cache
+        return reply
+    
+    if key and reply and (cache_if is None or cache_if(reply)):
+        llm_cache.set(key, reply)
+    return reply
+
+def send_raw_prompt(conversation, prompt, cache_if=None, json_format=None):
+    """
+    Envoie une requête brute à l'API ChatGPT.
+    """
+    try:
+        reply = create_completion(conversation, conversation.messages(prompt), cache_if, json_format)
+        conversation.add_exchange(prompt, reply)
         logger.info("Response received successfully")
         return reply
     except Exception as e:
         logger.error(f"Failed to send prompt: {e}", exc_info=True)
         return None
 
+def _is_json(reply):
+    try:
+        json.loads(reply)
+        return True
+    except ValueError:
+        return False
+
+def send_structured_prompt(conversation, prompt, schema, name, on_item=None):
+    """
+    Envoie un prompt dont la réponse est contrainte par un JSON schema.
+    La réponse n'est pas ajoutée à l'historique de la conversation.
+    """
+    try:
+        reply = create_completion(
+            conversation,
+            conversation.messages(prompt),
+            cache_if=_is_json,
+            json_format="raw",
+            on_item=on_item,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": name, "schema": schema, "strict": True},
+            },
+        )
+        logger.info("Structured response received successfully")
+        return json.loads(reply)
+    except Exception as e:
+        logger.error(f"Failed to send structured prompt: {e}", exc_info=True)
+        return None
+
 def extract_json_from_response(response):
     """
     Extrait un JSON depuis une réponse textuelle de ChatGPT.
@@ -71,20 +301,21 @@ def extract_json_from_response(response):
         logger.error(f"Failed to extract JSON: {e}", exc_info=True)
         return None
 
-def send_json_prompt(browser, prompt):
+def send_json_prompt(conversation, prompt):
     """
     Envoie un prompt et tente d’extraire une réponse JSON.
     """
-    response = send_raw_prompt(browser, prompt)
+    response = send_raw_prompt(conversation, prompt, cache_if=lambda reply: "```json" in reply, json_format="fenced")
     return extract_json_from_response(response)
 
-def get_number_of_steps(browser, caption=None):
+@traced("get_number_of_steps")
+def get_number_of_steps(conversation, caption=None):
     """
     Récupère le nombre d'étapes d'une recette.
     """
     try:
         prompt = "How many steps are in this recipe? Please respond with only a number."
-        response = send_raw_prompt(browser, prompt)
+        response = send_raw_prompt(conversation, prompt, cache_if=lambda reply: re.search(r"\d+", reply))
         if response:
             numbers = re.findall(r"\d+", response)
             if numbers:
@@ -97,7 +328,8 @@ def get_number_of_steps(browser, caption=None):
         logger.error(f"Error in get_number_of_steps: {e}", exc_info=True)
         return None
 
-def process_recipe_part(browser, part, mode="", step_number=None):
+@traced("process_recipe_part")
+def process_recipe_part(conversation, part, mode="", step_number=None):
     """
     Envoie un prompt formaté à GPT et extrait la réponse structurée.
     """
@@ -105,7 +337,11 @@ def process_recipe_part(browser, part, mode="", step_number=None):
         lang = os.getenv("LANGUAGE_CODE", "en")
 
         if mode == "step" or step_number is not None:
-            prompt = f"Write your Response in {lang}. Please fill out this JSON document {part}. Only complete step {step_number} of the recipe. Only include up to 3 ingredients. Use decimals for amounts. Do not repeat ingredients. Step name should be '{step_number}.'. Wrap your response in ```json code block."
+            prompt = f"Write your Response in {lang}. Please fill out this JSON document {part}. Only complete step {step_number} of the recipe. Only include up to 3 ingredients. Use decimals for amounts. Only include ingredients used in this step. Step name should be '{step_number}.'. Wrap your response in ```json code block."
+        elif mode == "recipe":
+            prompt = f"Write your Response in {lang}. Please fill out this JSON document {part}. Extract the complete recipe. Keep the name short. Add one entry to 'steps' per instruction, step names should be the step number like '1.'. Use decimals for amounts. Only list an ingredient in the first step that uses it. Times are in minutes. Wrap your response in ```json code block."
+        elif mode == "steps":
+            prompt = f"Write your Response in {lang}. Please fill out this JSON document {part}. Add one entry to 'steps' per instruction, step names should be the step number like '1.'. Use decimals for amounts. Only list an ingredient in the first step that uses it. Wrap your response in ```json code block."
         elif mode == "info":
             prompt = f"Write your Response in {lang}. Please fill out this JSON document {part}. Only fill out author, description, recipeYield, prepTime and cooktime. Format times as PT15M or PT1H."
         elif mode == "ingredients":
@@ -119,7 +355,21 @@ def process_recipe_part(browser, part, mode="", step_number=None):
         else:
             prompt = f"Write your Response in {lang}. Please fill out this JSON document {part}. Only complete the specified sections. Wrap your response in ```json code block."
 
-        return send_json_prompt(browser, prompt)
+        return send_json_prompt(conversation, prompt)
     except Exception as e:
         logger.error(f"Error processing {mode if mode else 'recipe part'}: {e}", exc_info=True)
-        return None
\ No newline at end of file
+        return None
+
+def _report_step(key, count):
+    # Les étapes arrivent une par une pendant le streaming de la recette complète
+    if key == "steps":
+        report_progress(f"Step {count} received")
+
+@traced("process_full_recipe")
+def process_full_recipe(conversation, schema):
+    """
+    Demande la recette complète en une seule requête contrainte par le schema.
+    """
+    lang = os.getenv("LANGUAGE_CODE", "en")
+    prompt = f"Write your Response in {lang}. Extract the complete recipe. Keep the name short. Create one step per instruction, step names should be the step number like '1.'. Use decimals for amounts. Only list an ingredient in the first step that uses it. Times are in minutes."
+    return send_structured_prompt(conversation, prompt, schema, "recipe", on_item=_report_step)
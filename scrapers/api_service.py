@@ -1,25 +1,57 @@
+import asyncio
 import json
 import os
+import time
 from io import BytesIO
 
 import requests as request
-from PIL import Image
 
 from logs import setup_logging
+from metrics import UPLOAD_LATENCY, UPLOAD_RESPONSES
+from scrapers.http_client import get_session, get_timeout
+from scrapers.thumbnails import encode_thumbnail
+from scrapers.tracing import traced
 
 logger = setup_logging("recipe_api")
 
-def send_recipe(api_type, json_data, thumbnail_filename):
+def _send_request(api_type, kind, method, url, **kwargs):
+    """
+    Send a request to a recipe API with its pooled session, recording the
+    latency and the status code of the response.
+    
+    Args:
+        api_type (str): Type of API ("TANDOOR" or "MEALIE")
+        kind (str): What is sent ("recipe" or "image")
+        method (str): The HTTP method
+        url (str): The URL of the request
+        
+    Returns:
+        requests.Response: The response
+    """
+    api = api_type.lower()
+    started = time.perf_counter()
+    status_code = "error"
+    try:
+        # Pooled session of the API, retrying transient errors
+        response = get_session(api, retry=True).request(method, url, timeout=get_timeout(), **kwargs)
+        status_code = str(response.status_code)
+        return response
+    finally:
+        UPLOAD_LATENCY.labels(api, kind).observe(time.perf_counter() - started)
+        UPLOAD_RESPONSES.labels(api, kind, status_code).inc()
+
+@traced("send_recipe")
+def send_recipe(api_type, json_data, thumbnail):
     """
     Unified function to send a recipe to either Tandoor or Mealie API
     
     Args:
         api_type (str): Type of API to use ("tandoor" or "mealie")
         json_data (dict): Recipe data in JSON format
-        thumbnail_filename (str): Path to thumbnail image file
+        thumbnail (bytes): Thumbnail image, or None
         
     Returns:
-        dict: Response information with status and recipe ID
+        dict: Response information with status, recipe ID and URL of the recipe (Tandoor only)
     """
     api_type = api_type.upper()
     
@@ -32,9 +64,12 @@ def send_recipe(api_type, json_data, thumbnail_filename):
     if api_type == "TANDOOR":
         create_endpoint = "/api/recipe/"
         extract_id = lambda response: response.json().get('id')
+        recipe_url = lambda recipe_id: f"{base_url}/view/recipe/{recipe_id}"
     elif api_type == "MEALIE":
         create_endpoint = "/api/recipes/create/html-or-json"
         extract_id = lambda response: response.content.decode('utf-8').strip('"')
+        # The page of a recipe depends on the Mealie version and group
+        recipe_url = lambda recipe_id: None
     else:
         api_logger.error(f"Unknown API type: {api_type}")
         return {"status": "error", "error": f"Unknown API type: {api_type}"}
@@ -42,35 +77,38 @@ def send_recipe(api_type, json_data, thumbnail_filename):
     # Common headers for both APIs
     headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
     
+    response = None
+    
     try:
         # Send recipe data to API
         api_logger.info(f"Sending recipe to {api_type} API: {base_url}")
-        response = request.post(f'{base_url}{create_endpoint}', 
-                              json=json_data, 
-                              headers=headers)
+        response = _send_request(api_type, "recipe", "POST", f'{base_url}{create_endpoint}', 
+                                 json=json_data, 
+                                 headers=headers)
+        response.raise_for_status()
         
         # Extract recipe ID
         recipe_id = extract_id(response)
         api_logger.info(f"{api_type} Recipe ID: {recipe_id}")
         
         # Upload thumbnail if available
-        if thumbnail_filename and recipe_id and os.path.exists(thumbnail_filename):
+        if thumbnail and recipe_id:
             if api_type == "TANDOOR":
-                upload_tandoor_thumbnail(base_url, token, recipe_id, thumbnail_filename, api_logger)
+                upload_tandoor_thumbnail(base_url, token, recipe_id, thumbnail, api_logger)
             else:
-                upload_mealie_thumbnail(base_url, token, recipe_id, thumbnail_filename, api_logger)
-            
-        response.raise_for_status()
+                upload_mealie_thumbnail(base_url, token, recipe_id, thumbnail, api_logger)
         
         return {
             "status": "success",
             "recipe_id": recipe_id,
-            "api_type": api_type
+            "api_type": api_type,
+            "url": recipe_url(recipe_id) if recipe_id else None
         }
 
     except request.exceptions.HTTPError as http_err:
         api_logger.error(f"HTTP error occurred: {http_err}")
-        api_logger.error(f"Response content: {response.content}")
+        if response is not None:
+            api_logger.error(f"Response content: {response.content}")
         return {"status": "error", "error": str(http_err)}
     except request.exceptions.ConnectionError as conn_err:
         api_logger.error(f"Connection error occurred: {conn_err}")
@@ -88,80 +126,86 @@ def send_recipe(api_type, json_data, thumbnail_filename):
         api_logger.info(json.dumps(json_data, indent=2))
 
 
-def upload_tandoor_thumbnail(base_url, token, recipe_id, thumbnail_filename, logger):
+async def send_recipe_async(api_type, json_data, thumbnail):
+    """
+    Async variant of send_recipe, the upload runs in a worker thread so
+    uploads of different jobs can overlap.
+    
+    Args:
+        api_type (str): Type of API to use ("tandoor" or "mealie")
+        json_data (dict): Recipe data in JSON format
+        thumbnail (bytes): Thumbnail image, or None
+        
+    Returns:
+        dict: Response information with status and recipe ID
+    """
+    return await asyncio.to_thread(send_recipe, api_type, json_data, thumbnail)
+
+
+def upload_tandoor_thumbnail(base_url, token, recipe_id, thumbnail, logger):
     """
     Upload a thumbnail image to an existing Tandoor recipe
     """
     headers = {'Authorization': f'Bearer {token}'}
     
     try:
-        # Open and optimize the image
-        with Image.open(thumbnail_filename) as img:
-            # Convert to RGB if needed (in case of PNG with alpha channel)
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[3])  # 3 is the alpha channel
-                img = background
-            
-            # Save to a BytesIO object
-            img_byte_arr = BytesIO()
-            img.save(img_byte_arr, format='JPEG', quality=85)
-            img_byte_arr.seek(0)
-            
-            # Create the multipart form data
-            files = {
-                'image': (os.path.basename(thumbnail_filename), img_byte_arr, 'image/jpeg')
-            }
-            
-            # Send the request to the specific image endpoint
-            response = request.put(
-                f'{base_url}/api/recipe/{recipe_id}/image/',
-                files=files,
-                headers=headers
-            )
-            response.raise_for_status()
-            logger.info(f"Successfully uploaded thumbnail for Tandoor recipe {recipe_id}")
+        # Resize and encode the image once, in memory
+        image_bytes, mime_type, extension = encode_thumbnail(thumbnail, "TANDOOR")
+        
+        # Create the multipart form data
+        files = {
+            'image': (f'image.{extension}', BytesIO(image_bytes), mime_type)
+        }
+        
+        # Send the request to the specific image endpoint
+        response = _send_request(
+            "TANDOOR", "image", "PUT",
+            f'{base_url}/api/recipe/{recipe_id}/image/',
+            files=files,
+            headers=headers
+        )
+        response.raise_for_status()
+        logger.info(f"Successfully uploaded thumbnail for Tandoor recipe {recipe_id}")
             
     except Exception as e:
         logger.error(f"Failed to upload thumbnail: {e}")
-        logger.error(f"Thumbnail path: {thumbnail_filename}")
+        logger.error(f"Thumbnail size: {len(thumbnail)} bytes")
 
 
-def upload_mealie_thumbnail(base_url, token, recipe_slug, thumbnail_filename, logger):
+def upload_mealie_thumbnail(base_url, token, recipe_slug, thumbnail, logger):
     """
     Upload a thumbnail image to an existing Mealie recipe
     """
     headers = {'Authorization': f'Bearer {token}'}
     
     try:
-        # Get file extension
-        _, extension = os.path.splitext(thumbnail_filename)
-        extension = extension.lstrip('.').lower()
+        # Resize and encode the image once, in memory
+        image_bytes, mime_type, extension = encode_thumbnail(thumbnail, "MEALIE")
         
         # Clean up the recipe slug - remove quotes if present
         recipe_slug = recipe_slug.strip('"\'')
         
         # Prepare the files for upload
-        with open(thumbnail_filename, 'rb') as img_file:
-            files = {
-                'image': (f'image.{extension}', img_file, f'image/{extension}'),
-                'extension': (None, extension)
-            }
-            
-            # Send the request
-            response = request.put(
-                f'{base_url}/api/recipes/{recipe_slug}/image',
-                files=files,
-                headers=headers
-            )
-            
-            logger.info(f"Image upload response status: {response.status_code}")
-            if response.text:
-                logger.info(f"Image upload response: {response.text}")
-            response.raise_for_status()
-            logger.info(f"Successfully uploaded thumbnail for Mealie recipe {recipe_slug}")
+        files = {
+            'image': (f'image.{extension}', BytesIO(image_bytes), mime_type),
+            'extension': (None, extension)
+        }
+        
+        # Send the request
+        response = _send_request(
+            "MEALIE", "image", "PUT",
+            f'{base_url}/api/recipes/{recipe_slug}/image',
+            files=files,
+            headers=headers
+        )
+        
+        logger.info(f"Image upload response status: {response.status_code}")
+        if response.text:
+            logger.info(f"Image upload response: {response.text}")
+        response.raise_for_status()
+        logger.info(f"Successfully uploaded thumbnail for Mealie recipe {recipe_slug}")
             
     except Exception as e:
         logger.error(f"Failed to upload thumbnail: {e}")
-        logger.error(f"Thumbnail path: {thumbnail_filename}")
+        logger.error(f"Thumbnail size: {len(thumbnail)} bytes")
         logger.error(f"Recipe slug: {recipe_slug}")
\ No newline at end of file
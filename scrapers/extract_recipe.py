@@ -0,0 +1,422 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from logs import setup_logging
+from scrapers.social_scraper import get_caption_from_post
+from scrapers.tracing import report_progress
+
+logger = setup_logging("extract_recipe")
+
+# Maximum number of concurrent LLM requests per job
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+
+# JSON templates for the different parts of the recipe
+JSON_PARTS = {
+    "name": {
+        "name": "string",
+        "description": "string",
+        "keywords": [
+            {
+            "name": "string",
+            "description": "string"
+            }
+        ],
+    },
+    "steps": {
+        "name": "string",
+        "instruction": "string",
+        "ingredients": [
+            {
+            "food": {
+                "name": "string",
+                "plural_name": "string"
+            },
+            "unit": {
+                "name": "string",
+                "plural_name": "string"
+            },
+            "amount": 0.0,
+            "note": "string"
+            }
+        ],
+        "time": 0
+    },
+    "servings": {
+        "servings": 0,
+    },
+    "timing": {
+        "working_time": 0,
+        "waiting_time": 0,
+    },
+    "nutrition": {
+        "nutrition": {
+            "calories": "string",
+            "fat": "string"
+        }
+    }
+}
+
+# JSON template of the whole recipe, for backends without structured output
+RECIPE_TEMPLATE = {
+    **JSON_PARTS["name"],
+    "steps": [JSON_PARTS["steps"]],
+    **JSON_PARTS["servings"],
+    **JSON_PARTS["timing"],
+    **JSON_PARTS["nutrition"],
+}
+
+def _object_schema(properties):
+    # Structured outputs need every property to be required and no extra properties
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties.keys()),
+        "additionalProperties": False,
+    }
+
+# JSON schema of the canonical recipe, used to extract everything in a single request
+RECIPE_SCHEMA = _object_schema({
+    "name": {"type": "string"},
+    "description": {"type": "string"},
+    "keywords": {
+        "type": "array",
+        "items": _object_schema({
+            "name": {"type": "string"},
+            "description": {"type": "string"},
+        }),
+    },
+    "steps": {
+        "type": "array",
+        "items": _object_schema({
+            "name": {"type": "string"},
+            "instruction": {"type": "string"},
+            "time": {"type": "integer"},
+            "ingredients": {
+                "type": "array",
+                "items": _object_schema({
+                    "food": _object_schema({
+                        "name": {"type": "string"},
+                        "plural_name": {"type": "string"},
+                    }),
+                    "unit": _object_schema({
+                        "name": {"type": "string"},
+                        "plural_name": {"type": "string"},
+                    }),
+                    "amount": {"type": "number"},
+                    "note": {"type": "string"},
+                }),
+            },
+        }),
+    },
+    "servings": {"type": "integer"},
+    "working_time": {"type": "integer"},
+    "waiting_time": {"type": "integer"},
+    "nutrition": _object_schema({
+        "calories": {"type": "string"},
+        "fat": {"type": "string"},
+    }),
+})
+
+# Keys of the recipe for each section
+RECIPE_SECTIONS = {
+    "name": ("name", "description", "keywords"),
+    "steps": ("steps",),
+    "servings": ("servings",),
+    "timing": ("working_time", "waiting_time"),
+    "nutrition": ("nutrition",),
+}
+
+SECTION_LABELS = {
+    "name": "recipe name and description",
+    "steps": "recipe steps",
+    "servings": "serving information",
+    "timing": "timing information",
+    "nutrition": "nutrition information",
+}
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_recipe(recipe):
+    """
+    Validate a recipe returned by the single request extraction.
+    
+    Args:
+        recipe (dict): The extracted recipe.
+    
+    Returns:
+        list: The names of the sections (keys of RECIPE_SECTIONS) that are invalid.
+    """
+    if not isinstance(recipe, dict):
+        return list(RECIPE_SECTIONS)
+    
+    invalid = []
+    
+    name = recipe.get("name")
+    description = recipe.get("description")
+    keywords = recipe.get("keywords")
+    if not isinstance(name, str) or not name.strip() or not isinstance(description, str) or not isinstance(keywords, list):
+        invalid.append("name")
+    
+    steps = recipe.get("steps")
+    if not isinstance(steps, list) or not steps:
+        invalid.append("steps")
+    else:
+        for step in steps:
+            instruction = step.get("instruction") if isinstance(step, dict) else None
+            ingredients = step.get("ingredients") if isinstance(step, dict) else None
+            if not isinstance(instruction, str) or not instruction.strip() or not isinstance(ingredients, list):
+                invalid.append("steps")
+                break
+            if any(
+                not isinstance(ingredient, dict)
+                or not isinstance(ingredient.get("food"), dict)
+                or not ingredient["food"].get("name")
+                or not _is_number(ingredient.get("amount"))
+                for ingredient in ingredients
+            ):
+                invalid.append("steps")
+                break
+    
+    servings = recipe.get("servings")
+    if not isinstance(servings, int) or isinstance(servings, bool) or servings <= 0:
+        invalid.append("servings")
+    
+    if not all(
+        isinstance(recipe.get(key), int) and recipe.get(key) >= 0
+        for key in ("working_time", "waiting_time")
+    ):
+        invalid.append("timing")
+    
+    nutrition = recipe.get("nutrition")
+    if not isinstance(nutrition, dict) or not all(isinstance(value, str) for value in nutrition.values()):
+        invalid.append("nutrition")
+    
+    return invalid
+
+def _remove_repeated_ingredients(steps):
+    """Only keep an ingredient in the first step that uses it"""
+    seen = set()
+    for step in steps:
+        ingredients = []
+        for ingredient in step.get("ingredients", []):
+            food = ingredient.get("food") or {}
+            name = str(food.get("name", "")).strip().casefold()
+            if name and name in seen:
+                continue
+            seen.add(name)
+            ingredients.append(ingredient)
+        step["ingredients"] = ingredients
+    return steps
+
+def _named(value):
+    """Food, unit or keyword as an object, replies sometimes only give the name"""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value.strip():
+        return {"name": value.strip()}
+    return None
+
+def _canonical_step(step):
+    """
+    Only keep the fields of the schema in a step (part prompts may return
+    more) and give them the types of the schema, replies that aren't
+    constrained by a schema can use other shapes.
+    """
+    ingredients = step.get("ingredients")
+    return {
+        "name": step.get("name") or "",
+        "instruction": step.get("instruction") or "",
+        "time": step.get("time") or 0,
+        "ingredients": [
+            {
+                "food": _named(ingredient.get("food")) or {},
+                "unit": _named(ingredient.get("unit")),
+                "amount": ingredient.get("amount", 0),
+                "note": ingredient.get("note") or "",
+            }
+            for ingredient in (ingredients if isinstance(ingredients, list) else [])
+            if isinstance(ingredient, dict)
+        ],
+    }
+
+def _canonical_recipe(full_json):
+    """The extracted sections as a recipe following RECIPE_SCHEMA, missing sections get empty defaults"""
+    steps = full_json.get("steps")
+    steps = [_canonical_step(step) for step in (steps if isinstance(steps, list) else []) if isinstance(step, dict)]
+    keywords = full_json.get("keywords")
+    keywords = [_named(keyword) for keyword in (keywords if isinstance(keywords, list) else [])]
+    nutrition = full_json.get("nutrition")
+    return {
+        "name": full_json.get("name") or "",
+        "description": full_json.get("description") or "",
+        "keywords": [keyword for keyword in keywords if keyword],
+        "steps": _remove_repeated_ingredients(steps),
+        "servings": full_json.get("servings", 0),
+        "working_time": full_json.get("working_time", 0),
+        "waiting_time": full_json.get("waiting_time", 0),
+        "nutrition": nutrition if isinstance(nutrition, dict) else {},
+    }
+
+def _process_in_fork(backend, session, part, mode="", step_number=None):
+    # Every prompt gets its own copy of the conversation so they can run concurrently
+    fork = backend.fork_chat(session)
+    try:
+        return backend.process_recipe_part(fork, part, mode, step_number)
+    finally:
+        if fork is not session:
+            backend.end_chat(fork)
+
+def _request_sections(backend, session, sections):
+    """
+    Request recipe sections part by part. The prompts are sent concurrently,
+    at most LLM_CONCURRENCY at a time (or less if the backend is limited),
+    and the steps are put back in order. Backends without structured output
+    get all the steps in a single prompt.
+    
+    Args:
+        backend (LLMBackend): The LLM backend.
+        session: The chat session of the backend.
+        sections (list): The sections to request (keys of RECIPE_SECTIONS).
+    
+    Returns:
+        dict: The recipe keys of the requested sections.
+    """
+    # (section, step number, JSON template) for every prompt to send
+    prompts = []
+    if "name" in sections:
+        prompts.append(("name", None, JSON_PARTS["name"]))
+    if "steps" in sections and not backend.structured_output:
+        # These backends are slow or limited to one prompt at a time, don't send a prompt per step
+        prompts.append(("steps", None, {"steps": [JSON_PARTS["steps"]]}))
+    elif "steps" in sections:
+        # Get the number of steps in the recipe
+        number_of_steps = backend.get_number_of_steps(session)
+        if not number_of_steps:
+            logger.error("Failed to determine number of steps in recipe")
+            raise Exception("Failed to determine number of steps in recipe")
+        logger.info(f"Recipe has {number_of_steps} steps")
+        prompts.extend(("steps", i, JSON_PARTS["steps"]) for i in range(1, number_of_steps + 1))
+    for section in ("servings", "timing", "nutrition"):
+        if section in sections:
+            prompts.append((section, None, JSON_PARTS[section]))
+    
+    logger.info(f"Sending {len(prompts)} recipe prompts")
+    concurrency = min(LLM_CONCURRENCY, backend.concurrency or LLM_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Run every prompt in a copy of the current context to keep the job trace
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _process_in_fork, backend, session, part, _prompt_mode(section, step_number), step_number
+            )
+            for section, step_number, part in prompts
+        ]
+        # Report the steps as they arrive, whatever their order
+        step_futures = [future for future, (_, step_number, _) in zip(futures, prompts) if step_number]
+        for received, _ in enumerate(as_completed(step_futures), start=1):
+            report_progress(f"Step {received} of {len(step_futures)} received", received / len(step_futures))
+        results = [future.result() for future in futures]
+    
+    full_json = {"steps": []} if "steps" in sections else {}
+    for (section, step_number, _), res in zip(prompts, results):
+        label = f"step {step_number}" if step_number else SECTION_LABELS[section]
+        if not res or not isinstance(res, dict):
+            logger.warning(f"Failed to get {label}")
+        elif step_number:
+            full_json["steps"].append(res)
+            logger.info(f"Step {step_number} processed successfully")
+        elif section == "steps":
+            full_json["steps"].extend(res.get("steps") or [])
+            logger.info(f"Got {len(full_json['steps'])} steps")
+        else:
+            full_json.update({key: res[key] for key in RECIPE_SECTIONS[section] if key in res})
+            logger.info(f"Got {label}")
+    return full_json
+
+def _prompt_mode(section, step_number):
+    if step_number:
+        return "step"
+    return "steps" if section == "steps" else ""
+
+def extract_recipe(url, platform, llm, use_cache=True):
+    """
+    Extract the recipe of an Instagram or TikTok post, independently of the
+    recipe manager it is sent to. Uses a single chat session of the LLM
+    backend for the whole recipe.
+    
+    The recipe is extracted with a single request first (constrained by
+    RECIPE_SCHEMA if the backend supports structured output, else by filling
+    out RECIPE_TEMPLATE), only the sections that fail validation are
+    requested again part by part. Set TANDOOR_EXTRACTION_MODE=parts to
+    always use the part by part extraction.
+    
+    Args:
+        url (str): The URL of the social media post containing the recipe.
+        platform (str): The platform ('instagram' or 'tiktok').
+        llm (LLMBackend): The LLM backend.
+        use_cache (bool, optional): Whether cached LLM responses may be used. Defaults to True.
+    
+    Returns:
+        tuple: (recipe, thumbnail). The recipe follows RECIPE_SCHEMA, missing
+            sections get empty defaults. The thumbnail can be None.
+    
+    Raises:
+        Exception: If the caption or the recipe can't be extracted.
+    """
+    result = get_caption_from_post(url, platform)
+    
+    if result is None:
+        logger.error("No caption or image found")
+        raise Exception("No caption or image found")
+    
+    caption, thumbnail = result
+    logger.info(f"Caption extracted successfully ({len(caption)} chars)")
+    
+    # Open a single chat session that will be used for all LLM interactions
+    logger.info(f"Using LLM backend {llm.name}")
+    session = llm.open_session()
+    if not session:
+        logger.error("Failed to open chat session")
+        raise Exception("Failed to open chat session")
+    
+    try:
+        # Initialize chat with the recipe caption to establish context
+        if not llm.initialize_chat(session, caption, use_cache):
+            logger.error("Failed to initialize chat with recipe context")
+            raise Exception("Failed to initialize chat with recipe context")
+        
+        full_json = {}
+        invalid_sections = list(RECIPE_SECTIONS)
+        
+        if os.getenv("TANDOOR_EXTRACTION_MODE", "single") == "single":
+            logger.info("Extracting the full recipe in a single request")
+            if llm.structured_output:
+                recipe = llm.process_full_recipe(session, RECIPE_SCHEMA)
+            else:
+                recipe = llm.process_recipe_part(session, RECIPE_TEMPLATE, "recipe")
+                report_progress("Recipe received")
+            if recipe:
+                invalid_sections = validate_recipe(recipe)
+                for section, keys in RECIPE_SECTIONS.items():
+                    if section not in invalid_sections:
+                        full_json.update({key: recipe[key] for key in keys})
+                if invalid_sections:
+                    logger.warning(f"Invalid sections in extracted recipe: {', '.join(invalid_sections)}")
+            else:
+                logger.warning("Failed to extract the full recipe in a single request")
+        
+        # Request the missing sections part by part
+        if invalid_sections:
+            full_json.update(_request_sections(llm, session, invalid_sections))
+    
+    except Exception as e:
+        logger.error(f"Error extracting recipe: {e}", exc_info=True)
+        raise
+    
+    finally:
+        # Always close the chat session
+        llm.close_session(session)
+    
+    return _canonical_recipe(full_json), thumbnail
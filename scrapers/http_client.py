@@ -0,0 +1,100 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+from logs import setup_logging
+
+logger = setup_logging("http_client")
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+class _Retry(Retry):
+    """
+    Retry policy that also retries POST requests, but only when the server
+    asks for it (429 / 503), so a recipe is never created twice. A
+    Retry-After longer than backoff_max fails right away instead of
+    blocking the worker.
+    """
+    
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == "POST":
+            return bool(self.total) and status_code in (429, 503)
+        return super().is_retry(method, status_code, has_retry_after)
+    
+    def sleep_for_retry(self, response):
+        retry_after = self.get_retry_after(response)
+        if retry_after is not None and retry_after > self.backoff_max:
+            reason = ResponseError(f"Retry-After of {retry_after:.0f}s is longer than {self.backoff_max:.0f}s")
+            raise MaxRetryError(None, response.url, reason)
+        return super().sleep_for_retry(response)
+
+def build_retry():
+    """
+    Build the retry policy of the API sessions: exponential backoff with
+    jitter on transient errors, honoring Retry-After on 429 and 503 up to
+    HTTP_BACKOFF_MAX seconds.
+    
+    Returns:
+        Retry: The retry policy.
+    """
+    return _Retry(
+        total=int(os.getenv("HTTP_RETRIES", 3)),
+        backoff_factor=float(os.getenv("HTTP_BACKOFF_FACTOR", 0.5)),
+        backoff_jitter=float(os.getenv("HTTP_BACKOFF_JITTER", 0.5)),
+        backoff_max=float(os.getenv("HTTP_BACKOFF_MAX", 30)),
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+def get_timeout():
+    """
+    Get the (connect, read) timeout of HTTP requests in seconds.
+    
+    Returns:
+        tuple: The connect and read timeouts.
+    """
+    return (
+        float(os.getenv("HTTP_CONNECT_TIMEOUT", 5)),
+        float(os.getenv("HTTP_READ_TIMEOUT", 30)),
+    )
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(name, retry=False):
+    """
+    Get a pooled HTTP session, shared by all jobs using the same name.
+    Keeping the session alive reuses the TCP/TLS connections between requests.
+    
+    Args:
+        name (str): Name of the session (e.g. "social", "tandoor").
+        retry (bool, optional): Retry transient errors (see build_retry). Defaults to False.
+    
+    Returns:
+        requests.Session: The shared session.
+    """
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            pool_size = int(os.getenv("HTTP_POOL_SIZE", 10))
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=build_retry() if retry else 0
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = os.getenv("SCRAPER_USER_AGENT", DEFAULT_USER_AGENT)
+            _sessions[name] = session
+            logger.info(f"Created HTTP session '{name}'")
+        return session
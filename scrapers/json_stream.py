@@ -0,0 +1,129 @@
+import re
+
+# Characters that can appear in JSON outside of strings (numbers, true, false, null)
+_JSON_CHARACTERS = set('{}[]:,-+.0123456789eEtrufalsn \t\r\n')
+_OPENING = {'}': '{', ']': '['}
+_FENCE = re.compile(r"```json[ \t]*\n?")
+
+class JsonStream:
+    """
+    Follows JSON received in chunks, without waiting for the whole text.
+    
+    The text is checked character by character, so a reply that can't become
+    valid JSON (Python quotes, mismatched brackets, closed code block) is
+    detected as soon as it goes wrong. The syntax of numbers and literals is
+    left to json.loads once the JSON is complete.
+    
+    Items closed in an array of the root object are reported as they arrive,
+    on_item(key, count) is called with the key of the array and the number of
+    items received so far.
+    """
+    WAITING = "waiting"
+    PARSING = "parsing"
+    COMPLETE = "complete"
+    INVALID = "invalid"
+    
+    def __init__(self, fenced=True, on_item=None):
+        """
+        Args:
+            fenced (bool, optional): The JSON is in a ```json code block of the text,
+                otherwise the whole text is JSON. Defaults to True.
+            on_item (callable, optional): Called when an item of a root array is received.
+        """
+        self.fenced = fenced
+        self.on_item = on_item
+        self.state = self.WAITING
+        self.error = None
+        self.text = ""
+        # Position of the end of the JSON in the text once complete
+        self.end = None
+        self._position = 0
+        # (bracket, key of the array in the root object) of the open brackets
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._key = None
+        self._last = None
+        self._counts = {}
+    
+    def feed(self, chunk):
+        """
+        Add the next chunk of the text.
+        
+        Returns:
+            str: The state, WAITING (no JSON yet), PARSING, COMPLETE or INVALID.
+        """
+        self.text += chunk
+        if self.state == self.WAITING:
+            if not self.fenced:
+                self.state = self.PARSING
+            else:
+                fence = _FENCE.search(self.text)
+                if not fence:
+                    return self.state
+                self.state = self.PARSING
+                self._position = fence.end()
+        
+        while self.state == self.PARSING and self._position < len(self.text):
+            self._read(self.text[self._position])
+            self._position += 1
+        return self.state
+    
+    def _fail(self, error):
+        self.state = self.INVALID
+        self.error = f"{error} at character {self._position}"
+    
+    def _read(self, char):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._last = '"'
+            elif len(self._stack) == 1:
+                # Possible key of the root object
+                self._string.append(char)
+            return
+        
+        if char in ' \t\r\n':
+            return
+        if not self._stack and char not in '{[':
+            return self._fail(f"Expected '{{' or '[' but got {char!r}")
+        
+        if char == '"':
+            self._in_string = True
+            self._string = []
+        elif char in '{[':
+            key = self._key if len(self._stack) == 1 and char == '[' else None
+            self._stack.append((char, key))
+            self._last = char
+        elif char in '}]':
+            if not self._stack or self._stack[-1][0] != _OPENING[char]:
+                return self._fail(f"Unexpected {char!r}")
+            if self._last == ',':
+                return self._fail("Trailing comma")
+            self._stack.pop()
+            self._last = char
+            if not self._stack:
+                self.state = self.COMPLETE
+                self.end = self._position + 1
+            elif len(self._stack) == 2 and self._stack[-1][0] == '[' and self._stack[-1][1]:
+                self._item_received(self._stack[-1][1])
+        elif char == ':':
+            if self._last != '"':
+                return self._fail("Expected a key before ':'")
+            if len(self._stack) == 1:
+                self._key = "".join(self._string)
+            self._last = char
+        elif char not in _JSON_CHARACTERS:
+            return self._fail(f"Unexpected {char!r}")
+        else:
+            self._last = char
+    
+    def _item_received(self, key):
+        self._counts[key] = self._counts.get(key, 0) + 1
+        if self.on_item:
+            self.on_item(key, self._counts[key])
@@ -0,0 +1,225 @@
+import os
+import threading
+
+from openai import OpenAI
+
+from logs import setup_logging
+from scrapers import ai_service, ai_service_natif
+from scrapers.manage_browser import close_browser, open_browser
+
+logger = setup_logging("llm_backends")
+
+class LLMBackend:
+    """
+    Common interface of the LLMs used to extract recipes.
+    
+    A session is opened for every job with open_session(), the other methods
+    take that session as first argument.
+    """
+    name = None
+    # The backend drives a browser (one more browser per job)
+    needs_browser = False
+    # process_full_recipe() can extract the whole recipe in a single request
+    structured_output = False
+    # Maximum number of prompts sent at the same time, None for no limit
+    concurrency = None
+    
+    def open_session(self):
+        """
+        Open a chat session.
+        
+        Returns:
+            object: The session, None if it could not be opened.
+        """
+        raise NotImplementedError
+    
+    def close_session(self, session):
+        """Close a session opened by open_session()"""
+        raise NotImplementedError
+    
+    def initialize_chat(self, session, caption, use_cache=True):
+        """
+        Give the recipe caption to the LLM as context of the session.
+        
+        Returns:
+            bool: True if successful.
+        """
+        raise NotImplementedError
+    
+    def send_json_prompt(self, session, prompt):
+        """
+        Send a prompt and extract the JSON of the response.
+        
+        Returns:
+            dict or None: The parsed JSON, None on failure.
+        """
+        raise NotImplementedError
+    
+    def process_recipe_part(self, session, part, mode="", step_number=None):
+        """
+        Fill out a part of the recipe.
+        
+        Returns:
+            dict or None: The filled out part, None on failure.
+        """
+        raise NotImplementedError
+    
+    def get_number_of_steps(self, session):
+        """
+        Returns:
+            int or None: The number of steps of the recipe.
+        """
+        raise NotImplementedError
+    
+    def process_full_recipe(self, session, schema):
+        """
+        Extract the whole recipe in a single request (if structured_output).
+        
+        Returns:
+            dict or None: The recipe, None on failure.
+        """
+        return None
+    
+    def fork_chat(self, session):
+        """
+        Get a copy of the session to send prompts concurrently.
+        Backends that can't copy a session return the session itself.
+        """
+        return session
+    
+    def end_chat(self, session):
+        """Forget a session returned by fork_chat()"""
+
+class OpenAIBackend(LLMBackend):
+    """
+    LLM behind an OpenAI compatible chat completions API, no browser needed.
+    """
+    
+    def __init__(self, name, client_factory=None, model=None, concurrency=None, structured_output=True):
+        self.name = name
+        self.model = model
+        self.concurrency = concurrency
+        self.structured_output = structured_output
+        self._client_factory = client_factory
+        self._client = None
+        self._lock = threading.Lock()
+    
+    @property
+    def client(self):
+        # Created on first use, the default client comes from ai_service_natif
+        if self._client_factory is None:
+            return None
+        with self._lock:
+            if self._client is None:
+                self._client = self._client_factory()
+            return self._client
+    
+    def open_session(self):
+        return ai_service_natif.Conversation(self.client, self.model)
+    
+    def close_session(self, session):
+        ai_service_natif.end_chat(session)
+    
+    def initialize_chat(self, session, caption, use_cache=True):
+        return ai_service_natif.initialize_chat(session, caption, use_cache)
+    
+    def send_json_prompt(self, session, prompt):
+        return ai_service_natif.send_json_prompt(session, prompt)
+    
+    def process_recipe_part(self, session, part, mode="", step_number=None):
+        return ai_service_natif.process_recipe_part(session, part, mode, step_number)
+    
+    def get_number_of_steps(self, session):
+        return ai_service_natif.get_number_of_steps(session)
+    
+    def process_full_recipe(self, session, schema):
+        if not self.structured_output:
+            return None
+        return ai_service_natif.process_full_recipe(session, schema)
+    
+    def fork_chat(self, session):
+        return ai_service_natif.fork_chat(session)
+    
+    def end_chat(self, session):
+        ai_service_natif.end_chat(session)
+
+class DuckAIBackend(LLMBackend):
+    """
+    Duck.ai driven through the browser. Prompts of a session are sent one at a time.
+    """
+    name = "duckai"
+    needs_browser = True
+    concurrency = 1
+    
+    def open_session(self):
+        return open_browser()
+    
+    def close_session(self, session):
+        close_browser(session)
+    
+    def initialize_chat(self, session, caption, use_cache=True):
+        # Duck.ai responses are never cached
+        return ai_service.initialize_chat(session, caption)
+    
+    def send_json_prompt(self, session, prompt):
+        return ai_service.send_json_prompt(session, prompt)
+    
+    def process_recipe_part(self, session, part, mode="", step_number=None):
+        return ai_service.process_recipe_part(session, part, mode, step_number)
+    
+    def get_number_of_steps(self, session):
+        return ai_service.get_number_of_steps(session)
+
+_backends = {}
+
+def register_backend(backend):
+    """
+    Make a backend available to the jobs.
+    
+    Args:
+        backend (LLMBackend): The backend, registered under its name.
+    """
+    _backends[backend.name] = backend
+
+def available_backends():
+    """
+    Returns:
+        list: The names of the registered backends.
+    """
+    return list(_backends)
+
+def get_backend(name=None, default="openai"):
+    """
+    Get a registered backend.
+    
+    Args:
+        name (str, optional): The backend chosen for the job. Defaults to the LLM_BACKEND
+            environment variable, then to default.
+        default (str, optional): The backend used when none is chosen.
+    
+    Returns:
+        LLMBackend: The backend.
+    
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    name = name or os.getenv("LLM_BACKEND") or default
+    backend = _backends.get(name.lower())
+    if backend is None:
+        raise ValueError(f"Unknown LLM backend '{name}'. Available backends: {', '.join(_backends)}")
+    return backend
+
+register_backend(OpenAIBackend("openai"))
+register_backend(DuckAIBackend())
+# Local model served by an OpenAI compatible server (llama.cpp server, Ollama, vLLM...)
+register_backend(OpenAIBackend(
+    "local",
+    client_factory=lambda: OpenAI(
+        base_url=os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:8080/v1"),
+        api_key=os.getenv("LOCAL_LLM_API_KEY", "local"),
+        timeout=float(os.getenv("LOCAL_LLM_TIMEOUT", 600))
+    ),
+    model=os.getenv("LOCAL_LLM_MODEL", "local"),
+    concurrency=int(os.getenv("LOCAL_LLM_CONCURRENCY", 1)),
+    structured_output=os.getenv("LOCAL_LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+))
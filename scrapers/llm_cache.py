@@ -0,0 +1,122 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from logs import setup_logging
+from metrics import LLM_CACHE_LOOKUPS
+
+logger = setup_logging("llm_cache")
+
+class LLMCache:
+    """
+    Persistent cache of LLM responses stored in SQLite.
+    
+    Entries are keyed by a hash of the caption, the prompt, the model name and
+    the language, and are evicted when they get too old or when the cache
+    holds too many entries (least recently used first).
+    """
+    
+    def __init__(self, path, max_entries, max_age_days):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 60 * 60
+        self._initialized = False
+    
+    @staticmethod
+    def make_key(caption, prompt, model, language):
+        """
+        Build the cache key of a request.
+        
+        Args:
+            caption (str): The caption of the post.
+            prompt (str): The prompt text (including the conversation history).
+            model (str): The model name.
+            language (str): The language code of the response.
+        
+        Returns:
+            str: The hex digest identifying the request.
+        """
+        digest = hashlib.sha256()
+        for value in (caption, prompt, model, language):
+            digest.update(str(value).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def get(self, key):
+        """
+        Get a cached response.
+        
+        Args:
+            key (str): The cache key.
+        
+        Returns:
+            str or None: The cached response, or None on a miss.
+        """
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.max_age)
+                ).fetchone()
+                if row:
+                    connection.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read from LLM cache: {e}")
+            row = None
+        
+        LLM_CACHE_LOOKUPS.labels("hit" if row else "miss").inc()
+        if row:
+            logger.info(f"LLM cache hit ({key[:12]})")
+            return row[0]
+        return None
+    
+    def set(self, key, response):
+        """
+        Store a response and evict old entries.
+        
+        Args:
+            key (str): The cache key.
+            response (str): The response to store.
+        """
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+                connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age,))
+                connection.execute(
+                    "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY last_used_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write to LLM cache: {e}")
+    
+    @contextmanager
+    def _connect(self):
+        if not self._initialized and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            if not self._initialized:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+                )
+                connection.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_used_at ON responses (last_used_at)")
+                connection.commit()
+                self._initialized = True
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+llm_cache = LLMCache(
+    path=os.getenv("LLM_CACHE_PATH", os.path.join("instance", "llm_cache.db")),
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000)),
+    max_age_days=int(os.getenv("LLM_CACHE_MAX_AGE_DAYS", 30))
+)
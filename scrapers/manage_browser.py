@@ -1,47 +1,137 @@
+import atexit
 import os
+import threading
 import time
+from contextlib import contextmanager
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from logs import setup_logging
+from scrapers.thumbnails import save_thumbnail
+from scrapers.tracing import span, traced
 
 logger = setup_logging("manage_browser")
 
-def open_browser(url=None, platform=None):
+# "lean" skips fonts, trackers and autoplaying media, "full" loads pages like a regular browser
+BROWSER_PROFILE = os.getenv("BROWSER_PROFILE", "lean").lower()
+
+# Requests blocked by the lean profile on Chrome and Edge
+BLOCKED_URLS = [
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*fonts.googleapis.com*", "*fonts.gstatic.com*",
+    "*googletagmanager.com*", "*google-analytics.com*", "*doubleclick.net*",
+    "*connect.facebook.net*", "*analytics.tiktok.com*",
+]
+
+# Seconds to wait for page elements on each platform
+ELEMENT_TIMEOUTS = {
+    "instagram": float(os.getenv("INSTAGRAM_ELEMENT_TIMEOUT", 5)),
+    "tiktok": float(os.getenv("TIKTOK_ELEMENT_TIMEOUT", 10)),
+    "duckai": float(os.getenv("DUCKAI_ELEMENT_TIMEOUT", 10)),
+}
+
+# Element showing that the content read from a post is in the page
+READY_SELECTORS = {
+    "instagram": 'meta[name="description"]',
+    "tiktok": "picture img[alt]",
+}
+
+def _platform_key(platform):
+    match platform:
+        case "instagram" | "i":
+            return "instagram"
+        case "tiktok" | "t":
+            return "tiktok"
+        case _:
+            return "duckai"
+
+def get_element_timeout(platform=None):
     """
-    Opens a browser window and navigates to the specified URL.
-    If no URL is provided, navigates to Duck AI website.
+    Get the number of seconds to wait for page elements.
     
     Args:
-        url (str, optional): URL to navigate to. Defaults to Duck.ai.
-        platform (str, optional): Platform type ("instagram", "tiktok") for specific handling.
+        platform (str, optional): Platform type ("instagram", "tiktok"), Duck.ai if None.
     
     Returns:
-        WebDriver: The browser window object.
+        float: The timeout in seconds.
     """
-    
-    logger.info(f"Opening browser{'for '+platform if platform else ''}")
+    return ELEMENT_TIMEOUTS[_platform_key(platform)]
 
+@contextmanager
+def _phase(name):
+    # Record the phase in the job trace and log how long it took
+    started = time.perf_counter()
+    try:
+        with span(f"browser.{name}"):
+            yield
+    finally:
+        logger.info(f"Browser phase {name} took {time.perf_counter() - started:.2f}s")
+
+def _apply_firefox_profile(options):
+    if BROWSER_PROFILE != "lean":
+        return
+    options.page_load_strategy = "eager"
+    # No web fonts
+    options.set_preference("gfx.downloadable_fonts.enabled", False)
+    options.set_preference("browser.display.use_document_fonts", 0)
+    # No autoplay, only the metadata and first frame of videos are loaded
+    options.set_preference("media.autoplay.default", 5)
+    options.set_preference("media.autoplay.blocking_policy", 2)
+    options.set_preference("media.preload.default", 1)
+    options.set_preference("media.preload.auto", 1)
+    # Block known third-party tracking scripts
+    options.set_preference("privacy.trackingprotection.enabled", True)
+
+def _apply_chromium_profile(options):
+    if BROWSER_PROFILE != "lean":
+        return
+    options.page_load_strategy = "eager"
+    options.add_argument("--autoplay-policy=user-gesture-required")
+
+def _block_chromium_requests(browser):
+    if BROWSER_PROFILE != "lean":
+        return
+    try:
+        browser.execute_cdp_cmd("Network.enable", {})
+        browser.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    except Exception as e:
+        logger.info(f"Failed to block requests: {e}")
+
+def _launch_browser():
+    """
+    Launches a new browser instance based on the BROWSER environment variable.
+    
+    Returns:
+        WebDriver: The browser window object.
+    """
     match os.getenv("BROWSER"):
         case "firefox":
             options = webdriver.FirefoxOptions()
             options.add_argument("--headless")
+            _apply_firefox_profile(options)
             browser = webdriver.Firefox(options=options) 
             logger.info("Using Firefox browser")
         case "chrome":
             options = webdriver.ChromeOptions()
             options.add_argument("--headless")
+            _apply_chromium_profile(options)
             browser = webdriver.Chrome(options=options)
+            _block_chromium_requests(browser)
             logger.info("Using Chrome browser")
         case "edge":
             options = webdriver.EdgeOptions()
             options.add_argument("--headless")
+            _apply_chromium_profile(options)
             browser = webdriver.Edge(options=options)
+            _block_chromium_requests(browser)
             logger.info("Using Edge browser")
         case "safari":
             options = webdriver.SafariOptions()
             options.add_argument("--headless")
+            if BROWSER_PROFILE == "lean":
+                options.page_load_strategy = "eager"
             browser = webdriver.Safari(options=options)
             logger.info("Using Safari browser")
         case "docker":
@@ -49,28 +139,231 @@ def open_browser(url=None, platform=None):
             options.add_argument("--headless")
             options.add_argument("--no-sandbox")
             options.add_argument("--disable-dev-shm-usage")
+            _apply_firefox_profile(options)
             service = webdriver.firefox.service.Service(executable_path="/usr/local/bin/geckodriver")
             browser = webdriver.Firefox(options=options, service=service)
             logger.info("Using Firefox browser in Docker environment")
         case _:
             options = webdriver.FirefoxOptions()
+            _apply_firefox_profile(options)
             browser = webdriver.Firefox(options=options)
             logger.info("Using default Firefox browser")
+    
+    logger.info(f"Browser launched with the {BROWSER_PROFILE} profile")
+    return browser
 
+class BrowserPool:
+    """
+    Keeps a number of launched browsers around so jobs don't pay the browser
+    startup cost every time. Browsers are leased, reset when they are
+    released and recycled after a maximum number of uses.
+    """
+    
+    def __init__(self, size, max_uses, lease_timeout=None):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.lease_timeout = lease_timeout
+        self._idle = []
+        self._uses = {}
+        self._live = 0
+        self._condition = threading.Condition()
+    
+    @property
+    def live_count(self):
+        """Number of browsers currently launched (idle or leased)"""
+        return self._live
+    
+    def lease(self):
+        """
+        Get a healthy browser from the pool, launching one if needed.
+        Blocks while all browsers are leased, at most lease_timeout seconds.
+        
+        Returns:
+            WebDriver: The browser window object.
+        
+        Raises:
+            TimeoutException: If no browser was released in time.
+        """
+        deadline = time.monotonic() + self.lease_timeout if self.lease_timeout else None
+        while True:
+            with self._condition:
+                while not self._idle and self._live >= self.size:
+                    remaining = deadline - time.monotonic() if deadline else None
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutException(f"No browser released after {self.lease_timeout:g}s ({self._live} leased)")
+                    self._condition.wait(remaining)
+                if self._idle:
+                    browser = self._idle.pop()
+                else:
+                    browser = None
+                    self._live += 1
+            
+            if browser is None:
+                try:
+                    with _phase("launch"):
+                        browser = _launch_browser()
+                except Exception:
+                    with self._condition:
+                        self._live -= 1
+                        self._condition.notify()
+                    raise
+                self._uses[id(browser)] = 0
+            elif not self._is_healthy(browser):
+                logger.info("Discarding unhealthy browser from pool")
+                self.discard(browser)
+                continue
+            
+            self._uses[id(browser)] += 1
+            return browser
+    
+    def release(self, browser):
+        """
+        Give a browser back to the pool. The browser is reset, or quit if it
+        reached its maximum number of uses or can't be reset.
+        
+        Args:
+            browser (WebDriver): The browser window object.
+        """
+        uses = self._uses.get(id(browser))
+        if uses is None:
+            logger.warning("Released a browser that is not part of the pool, quitting it")
+            browser.quit()
+            return
+        
+        if uses >= self.max_uses:
+            logger.info("Recycling browser after reaching its maximum number of uses")
+            self.discard(browser)
+            return
+        
+        try:
+            self._reset(browser)
+        except Exception as e:
+            logger.info(f"Failed to reset browser, discarding it: {e}")
+            self.discard(browser)
+            return
+        
+        with self._condition:
+            self._idle.append(browser)
+            self._condition.notify()
+    
+    def discard(self, browser):
+        """
+        Quit a browser and remove it from the pool.
+        
+        Args:
+            browser (WebDriver): The browser window object.
+        """
+        self._uses.pop(id(browser), None)
+        try:
+            browser.quit()
+        except Exception as e:
+            logger.error(f"Error closing browser: {e}")
+        with self._condition:
+            self._live -= 1
+            self._condition.notify()
+    
+    def warm(self, count=None):
+        """
+        Pre-launch browsers so the first jobs don't wait for startup.
+        
+        Args:
+            count (int, optional): Number of browsers to launch. Defaults to the pool size.
+        """
+        count = min(count or self.size, self.size)
+        browsers = []
+        try:
+            for _ in range(count):
+                browsers.append(self.lease())
+        except Exception as e:
+            logger.error(f"Failed to warm browser pool: {e}")
+        for browser in browsers:
+            self._uses[id(browser)] -= 1
+            with self._condition:
+                self._idle.append(browser)
+                self._condition.notify()
+        logger.info(f"Browser pool warmed with {len(browsers)} browsers")
+    
+    def shutdown(self):
+        """Quit all idle browsers"""
+        with self._condition:
+            browsers, self._idle = self._idle, []
+        for browser in browsers:
+            self.discard(browser)
+    
+    def _is_healthy(self, browser):
+        try:
+            browser.execute_script("return 1")
+            return len(browser.window_handles) > 0
+        except Exception:
+            return False
+    
+    def _reset(self, browser):
+        # Close every tab except the first one
+        handles = browser.window_handles
+        for handle in handles[1:]:
+            browser.switch_to.window(handle)
+            browser.close()
+        browser.switch_to.window(handles[0])
+        
+        # Clear the state of the last visited site
+        browser.delete_all_cookies()
+        browser.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+        browser.get("about:blank")
+
+browser_pool = BrowserPool(
+    size=int(os.getenv("BROWSER_POOL_SIZE", 2)),
+    max_uses=int(os.getenv("BROWSER_MAX_USES", 20)),
+    lease_timeout=float(os.getenv("BROWSER_LEASE_TIMEOUT", 300))
+)
+atexit.register(browser_pool.shutdown)
+
+@traced("open_browser")
+def open_browser(url=None, platform=None):
+    """
+    Leases a browser from the pool and navigates to the specified URL.
+    If no URL is provided, navigates to Duck AI website.
+    
+    Args:
+        url (str, optional): URL to navigate to. Defaults to Duck.ai.
+        platform (str, optional): Platform type ("instagram", "tiktok") for specific handling.
+    
+    Returns:
+        WebDriver: The browser window object.
+    """
+    
+    logger.info(f"Opening browser{' for '+platform if platform else ''}")
+    
+    with _phase("lease"):
+        browser = browser_pool.lease()
+    timeout = get_element_timeout(platform)
+    
     # Navigate to specified URL or Duck.ai
     target_url = url if url else "https://duck.ai/"
     logger.info(f"Navigating to {target_url}")
-    browser.get(target_url)
+    try:
+        with _phase("navigate"):
+            browser.get(target_url)
+    except Exception:
+        browser_pool.discard(browser)
+        raise
+    
+    # Wait for the content we need instead of a fixed delay
+    try:
+        with _phase("ready"):
+            _wait_until_ready(browser, platform, timeout)
+    except Exception:
+        browser_pool.discard(browser)
+        raise
     
     # Handle platform-specific setup
     if platform == "instagram" or platform == "i":
         try:
             logger.info("Waiting for Instagram overlay element to appear")
-            WebDriverWait(browser, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "xzkaem6"))
-            )
-            div = browser.find_element(By.CLASS_NAME, "xzkaem6")
-            browser.execute_script("arguments[0].style.visibility='hidden'", div)
+            with _phase("hide_overlay"):
+                div = WebDriverWait(browser, timeout).until(
+                    EC.presence_of_element_located((By.CLASS_NAME, "xzkaem6"))
+                )
+                browser.execute_script("arguments[0].style.visibility='hidden'", div)
             logger.info("Successfully hidden Instagram overlay")
         except Exception as e:
             logger.info(f"Failed to hide Instagram overlay: {e}")
@@ -79,72 +372,92 @@ def open_browser(url=None, platform=None):
     elif not url or "duck.ai" in target_url:
         try:
             logger.info("Navigating through Duck.ai welcome screens")
-            start_button = WebDriverWait(browser, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "/html/body/div[2]/div[6]/div[4]/div/div[2]/main/div/div[2]/div/button"))
-            )
-            start_button.click()
-            
-            continue_button = WebDriverWait(browser, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "/html/body/div[2]/div[6]/div[4]/div/div[2]/main/div/div[3]/div/button"))
-            )
-            continue_button.click()
+            with _phase("welcome_screens"):
+                start_button = WebDriverWait(browser, timeout).until(
+                    EC.element_to_be_clickable((By.XPATH, "/html/body/div[2]/div[6]/div[4]/div/div[2]/main/div/div[2]/div/button"))
+                )
+                start_button.click()
+                
+                continue_button = WebDriverWait(browser, timeout).until(
+                    EC.element_to_be_clickable((By.XPATH, "/html/body/div[2]/div[6]/div[4]/div/div[2]/main/div/div[3]/div/button"))
+                )
+                continue_button.click()
         except Exception as e:
             logger.error(f"Failed to navigate Duck.ai welcome screens: {e}", exc_info=True)
-            browser.quit()
+            browser_pool.discard(browser)
             return None
     
-    # General wait for content to load
-    time.sleep(0.5)
-    
     logger.info("Browser initialized successfully")
     return browser
-        
+
+def _wait_until_ready(browser, platform, timeout):
+    """
+    Wait until the DOM is parsed and, for posts, until the element holding
+    the caption is present. Continues after the timeout.
+    """
+    try:
+        WebDriverWait(browser, timeout).until(
+            lambda b: b.execute_script("return document.readyState") != "loading"
+        )
+        selector = READY_SELECTORS.get(_platform_key(platform))
+        if selector:
+            WebDriverWait(browser, timeout).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+            )
+    except TimeoutException:
+        logger.info(f"Page not ready after {timeout:.0f}s, continuing anyway")
+
 def close_browser(browser):
     """
-    Closes the browser window.
+    Gives the browser back to the pool.
     Args:
         browser (WebDriver): The browser window object to close.
     """
     
     if browser:
-        logger.info("Closing browser...")
+        logger.info("Releasing browser...")
         try:
-            browser.quit()
+            browser_pool.release(browser)
         except Exception as e:
             logger.error(f"Error closing browser: {e}")
 
-def capture_thumbnail(browser):
+def capture_thumbnail(browser, platform=None):
     """
     Attempts to capture a video thumbnail from the current page.
     
     Args:
         browser (WebDriver): The browser window object.
+        platform (str, optional): Platform type ("instagram", "tiktok"), used for the element timeout.
     
     Returns:
-        str or None: Path to the thumbnail file if successful, otherwise None.
+        bytes or None: The PNG screenshot of the video if successful, otherwise None.
     """
     if os.getenv("BROWSER") != "docker":
+        timeout = get_element_timeout(platform)
         try:
             logger.info("Attempting to capture video thumbnail")
-            # Create thumbnails directory if it doesn't exist
-            os.makedirs('thumbnails', exist_ok=True)
-            
-            # Generate a unique filename
-            thumbnail_filename = f"thumbnails/thumbnail_{int(time.time())}.png"
-            
-            # Wait for video element to be present
-            logger.info("Waiting for video element")
-            WebDriverWait(browser, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "video"))
-            )
-            
-            # Find the video element
-            video = browser.find_element(By.TAG_NAME, "video")
             
-            # Take screenshot of the video element
-            video.screenshot(thumbnail_filename)
-            logger.info(f"Thumbnail saved to {thumbnail_filename}")
-            return thumbnail_filename
+            with _phase("capture_thumbnail"):
+                # Wait for video element to be present
+                logger.info("Waiting for video element")
+                video = WebDriverWait(browser, timeout).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "video"))
+                )
+                
+                # Wait for the first frame, the lean profile only preloads metadata
+                try:
+                    browser.execute_script("if (arguments[0].readyState < 2) { arguments[0].preload = 'auto'; }", video)
+                    WebDriverWait(browser, timeout).until(
+                        lambda b: b.execute_script("return arguments[0].readyState", video) >= 2
+                    )
+                except TimeoutException:
+                    logger.info("Video frame not loaded, capturing it anyway")
+                
+                # Take screenshot of the video element, kept in memory
+                thumbnail = video.screenshot_as_png
+            logger.info(f"Thumbnail captured ({len(thumbnail)} bytes)")
+            save_thumbnail(thumbnail)
+            return thumbnail
         except Exception as e:
             logger.info(f"Failed to capture thumbnail: {e}")
             return None
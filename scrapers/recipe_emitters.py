@@ -0,0 +1,133 @@
+import json
+from datetime import datetime
+
+def to_tandoor(recipe, url):
+    """
+    Build the payload of the Tandoor recipe API from an extracted recipe.
+    
+    Args:
+        recipe (dict): The recipe returned by extract_recipe().
+        url (str): The URL of the post, used as source of the recipe.
+    
+    Returns:
+        dict: The recipe in the Tandoor format.
+    """
+    steps = []
+    for order, step in enumerate(recipe["steps"]):
+        steps.append({
+            "name": step["name"],
+            "instruction": step["instruction"],
+            "time": step["time"],
+            "order": order,
+            "show_as_header": True,
+            "show_ingredients_table": True,
+            "ingredients": [
+                {
+                    "food": ingredient["food"],
+                    "unit": ingredient["unit"],
+                    "amount": ingredient["amount"],
+                    "note": ingredient["note"],
+                    "order": ingredient_order,
+                    "is_header": False,
+                    "no_amount": False,
+                }
+                for ingredient_order, ingredient in enumerate(step["ingredients"])
+            ],
+        })
+    
+    return {
+        "name": recipe["name"],
+        "description": recipe["description"],
+        "keywords": recipe["keywords"],
+        "steps": steps,
+        "servings": recipe["servings"],
+        "working_time": recipe["working_time"],
+        "waiting_time": recipe["waiting_time"],
+        "source_url": url,
+        "internal": True,
+        "show_ingredient_overview": True,
+    }
+
+def _format_amount(amount):
+    if isinstance(amount, float) and amount.is_integer():
+        return str(int(amount))
+    return str(amount)
+
+def _format_ingredient(ingredient):
+    """Ingredient as a line of text, e.g. "400 g spaghetti (cooked)" """
+    amount = ingredient["amount"]
+    plural = not isinstance(amount, (int, float)) or amount != 1
+    parts = [_format_amount(amount)] if amount else []
+    for item in (ingredient["unit"], ingredient["food"]):
+        if item:
+            name = (plural and item.get("plural_name")) or item.get("name")
+            if name:
+                parts.append(name)
+    line = " ".join(parts)
+    if ingredient["note"]:
+        line += f" ({ingredient['note']})"
+    return line
+
+def _iso_duration(minutes):
+    """Minutes as an ISO 8601 duration (PT1H30M), None if unknown"""
+    if not isinstance(minutes, int) or minutes <= 0:
+        return None
+    hours, minutes = divmod(minutes, 60)
+    return "PT" + (f"{hours}H" if hours else "") + (f"{minutes}M" if minutes else "")
+
+def to_mealie(recipe, url):
+    """
+    Build the payload of the Mealie "create from HTML or JSON" API from an
+    extracted recipe: a schema.org Recipe in a JSON-LD script.
+    
+    Args:
+        recipe (dict): The recipe returned by extract_recipe().
+        url (str): The URL of the post.
+    
+    Returns:
+        dict: The recipe in the Mealie format.
+    """
+    json_ld = {
+        "@context": "https://schema.org",
+        "@type": "Recipe",
+        "name": recipe["name"],
+        "description": recipe["description"],
+        "url": url,
+        "datePublished": datetime.now().strftime("%Y-%m-%d"),
+        "keywords": ", ".join(keyword["name"] for keyword in recipe["keywords"] if keyword.get("name")),
+        "recipeYield": str(recipe["servings"]) if recipe["servings"] else "",
+        "recipeIngredient": [
+            _format_ingredient(ingredient)
+            for step in recipe["steps"]
+            for ingredient in step["ingredients"]
+        ],
+        "recipeInstructions": [
+            {"@type": "HowToStep", "text": step["instruction"]}
+            for step in recipe["steps"]
+        ],
+    }
+    
+    # Tandoor's working time is the active time, the waiting time is mostly cooking
+    for key, minutes in (("prepTime", recipe["working_time"]), ("cookTime", recipe["waiting_time"])):
+        duration = _iso_duration(minutes)
+        if duration:
+            json_ld[key] = duration
+    
+    nutrition = recipe["nutrition"]
+    if nutrition.get("calories") or nutrition.get("fat"):
+        json_ld["nutrition"] = {
+            "@type": "NutritionInformation",
+            "calories": nutrition.get("calories", ""),
+            "fatContent": nutrition.get("fat", ""),
+        }
+    
+    return {
+        "includeTags": False,
+        "data": f'<script type="application/ld+json">{json.dumps(json_ld)}</script>'
+    }
+
+# Recipe API and payload builder of every target
+EMITTERS = {
+    "tandoor": ("TANDOOR", to_tandoor),
+    "mealie": ("MEALIE", to_mealie),
+}
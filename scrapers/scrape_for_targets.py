@@ -0,0 +1,70 @@
+import json
+
+from logs import setup_logging
+from scrapers.api_service import send_recipe
+from scrapers.extract_recipe import extract_recipe
+from scrapers.llm_backends import get_backend
+from scrapers.recipe_emitters import EMITTERS
+
+logger = setup_logging("scrape_for_targets")
+
+# LLM backend used when none is chosen, for jobs with a single target
+DEFAULT_BACKENDS = {
+    "tandoor": "openai",
+    "mealie": "duckai",
+}
+
+# Job target -> recipe managers the recipe is sent to
+TARGETS = {
+    "tandoor": ["tandoor"],
+    "mealie": ["mealie"],
+    "both": ["tandoor", "mealie"],
+}
+
+def scrape_recipe_for_targets(url, platform, targets, use_cache=True, backend=None, skip_targets=()):
+    """
+    Extract the recipe of a post once and send it to every target.
+    
+    Args:
+        url (str): The URL of the social media post containing the recipe.
+        platform (str): The platform ('instagram' or 'tiktok').
+        targets (list): The recipe managers ('tandoor', 'mealie').
+        use_cache (bool, optional): Whether cached LLM responses may be used. Defaults to True.
+        backend (str, optional): Name of the LLM backend. Defaults to LLM_BACKEND, then to
+            the default of the target ("openai" with several targets).
+        skip_targets (iterable, optional): Targets that already have the recipe (previous attempt).
+    
+    Returns:
+        dict: "status" ("success" or "error"), "results" with the API result of every
+            target, "error" with the first failure, "urls" with the URL of the recipe in
+            every target that has one and "url" with the first of them (the post URL if none).
+    
+    Raises:
+        Exception: If the recipe can't be extracted.
+    """
+    default = DEFAULT_BACKENDS[targets[0]] if len(targets) == 1 else "openai"
+    llm = get_backend(backend, default=default)
+    targets = [target for target in targets if target not in skip_targets]
+    
+    recipe, thumbnail = extract_recipe(url, platform, llm, use_cache)
+    
+    # Save the extracted recipe
+    logger.info("Saving final JSON")
+    with open('./scrapers/final_json.json', 'w') as outfile:
+        json.dump(recipe, outfile, indent=2)
+    
+    results = {}
+    for target in targets:
+        api_type, emit = EMITTERS[target]
+        logger.info(f"Sending to {target.capitalize()} API")
+        results[target] = send_recipe(api_type, emit(recipe, url), thumbnail)
+    
+    errors = [f"{target}: {result.get('error')}" for target, result in results.items() if result.get("status") == "error"]
+    urls = {target: result["url"] for target, result in results.items() if result.get("url")}
+    return {
+        "status": "error" if errors else "success",
+        "results": results,
+        "error": "; ".join(errors) or None,
+        "urls": urls,
+        "url": next(iter(urls.values()), url),
+    }
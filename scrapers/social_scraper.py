@@ -1,25 +1,227 @@
-from bs4 import BeautifulSoup
+import json
+import os
+from html.parser import HTMLParser
+
 from logs import setup_logging
+from scrapers.http_client import get_session
 from scrapers.manage_browser import open_browser, close_browser, capture_thumbnail
+from scrapers.thumbnails import save_thumbnail
+from scrapers.tracing import traced
 
 # Setup logging
 logger = setup_logging("social_scraper")
 
+class _StopParsing(Exception):
+    pass
+
+def _caption_from_ld_json(text):
+    # Instagram: caption or article body of the ld+json entries
+    try:
+        entries = json.loads(text)
+    except ValueError:
+        return None
+    for entry in entries if isinstance(entries, list) else [entries]:
+        if isinstance(entry, dict):
+            caption = entry.get('caption') or entry.get('articleBody')
+            if caption:
+                return caption
+    return None
+
+def _caption_from_rehydration(text):
+    # TikTok: description of the video in the rehydration state
+    try:
+        state = json.loads(text)
+        item = state["__DEFAULT_SCOPE__"]["webapp.video-detail"]["itemInfo"]["itemStruct"]
+        return item.get('desc') or None
+    except (ValueError, KeyError, TypeError):
+        return None
+
+class _PostParser(HTMLParser):
+    """
+    Reads the caption sources of a post page without building a document
+    tree, and stops as soon as the caption and the thumbnail URL are found.
+    
+    Only the first matching element of each kind is used, like find() on
+    the whole document, so the result doesn't depend on where parsing stops.
+    """
+    
+    def __init__(self, platform, embedded):
+        super().__init__(convert_charrefs=True)
+        self.instagram = platform == "instagram" or platform == "i"
+        self.embedded = embedded
+        # Meta description (Instagram) or first <picture> image alt (TikTok), "" when empty
+        self.primary = None
+        self.image_url = None
+        self.embedded_caption = None
+        self._image_seen = False
+        self._rehydration_seen = False
+        self._in_picture = False
+        self._picture_img_seen = False
+        self._script = None
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == 'meta':
+            attrs = dict(attrs)
+            if not self._image_seen and attrs.get('property') == 'og:image':
+                self._image_seen = True
+                self.image_url = attrs.get('content') or None
+            elif self.instagram and self.primary is None and attrs.get('name') == 'description':
+                self.primary = attrs.get('content') or ""
+        elif tag == 'picture' and not self.instagram:
+            self._in_picture = True
+            self._picture_img_seen = False
+        elif tag == 'img' and self._in_picture and not self._picture_img_seen and self.primary is None:
+            # Only the first image of a picture counts
+            self._picture_img_seen = True
+            self.primary = dict(attrs).get('alt') or None
+        elif tag == 'script' and self.embedded and self.embedded_caption is None:
+            attrs = dict(attrs)
+            if self.instagram and attrs.get('type') == 'application/ld+json':
+                self._script = []
+            elif not self.instagram and not self._rehydration_seen and attrs.get('id') == '__UNIVERSAL_DATA_FOR_REHYDRATION__':
+                self._rehydration_seen = True
+                self._script = []
+        self._stop_if_done()
+    
+    def handle_endtag(self, tag):
+        if tag == 'picture':
+            self._in_picture = False
+        elif tag == 'script' and self._script is not None:
+            text = "".join(self._script)
+            self._script = None
+            if self.instagram:
+                self.embedded_caption = _caption_from_ld_json(text)
+            else:
+                self.embedded_caption = _caption_from_rehydration(text)
+            self._stop_if_done()
+    
+    def handle_data(self, data):
+        if self._script is not None:
+            self._script.append(data)
+    
+    def _stop_if_done(self):
+        if self._image_seen and self.primary:
+            raise _StopParsing()
+    
+    def parse(self, source):
+        try:
+            self.feed(source)
+            self.close()
+        except _StopParsing:
+            pass
+
+def parse_post_html(source, platform, embedded=False):
+    """
+    Extracts the caption and the thumbnail URL from the HTML of a post.
+    
+    Args:
+        source (str): The HTML of the post page.
+        platform (str): The platform ("instagram", "tiktok", "i", etc.)
+        embedded (bool, optional): Also look for the caption in the JSON state
+            embedded in the page. Defaults to False.
+    
+    Returns:
+        tuple: (caption, image_url), both can be None.
+    """
+    parser = _PostParser(platform, embedded)
+    parser.parse(source)
+    caption = None
+    
+    # Handle platform-specific caption extraction
+    if platform == "instagram" or platform == "i":
+        logger.info("Extracting Instagram caption")
+        content = parser.primary
+        if content:
+            logger.info(f"Found meta description: {content[:50]}...")
+            parts = content.split('"')
+            if len(parts) >= 2:
+                caption = parts[1]
+                logger.info(f"Extracted Instagram caption from meta quotes: {caption}.")
+    
+    else:
+        # Handle TikTok captions, found in <img> alt attributes within <picture> elements
+        logger.info("Extracting TikTok caption")
+        caption = parser.primary
+        if caption:
+            logger.info(f"Found TikTok caption from image alt: {caption[:50]}...")
+    
+    if not caption and embedded:
+        caption = parser.embedded_caption
+        if caption:
+            logger.info(f"Found caption in embedded JSON: {caption[:50]}...")
+    
+    return caption, parser.image_url
+
+def _download_thumbnail(session, image_url):
+    """
+    Downloads the thumbnail of a post.
+    
+    Returns:
+        bytes or None: The image if successful, otherwise None.
+    """
+    try:
+        response = session.get(image_url, timeout=10)
+        response.raise_for_status()
+        thumbnail = response.content
+        logger.info(f"Thumbnail downloaded ({len(thumbnail)} bytes)")
+        save_thumbnail(thumbnail)
+        return thumbnail
+    except Exception as e:
+        logger.info(f"Failed to download thumbnail: {e}")
+        return None
+
+def fetch_post_without_browser(url, platform):
+    """
+    Extracts the caption and thumbnail of a post with plain HTTP requests.
+    
+    Args:
+        url (str): The URL of the social media post.
+        platform (str): The platform ("instagram", "tiktok", "i", etc.)
+    
+    Returns:
+        tuple: (caption, thumbnail) if a caption was found, otherwise None.
+    """
+    session = get_session("social")
+    try:
+        response = session.get(url, timeout=10)
+        response.raise_for_status()
+    except Exception as e:
+        logger.info(f"Failed to fetch post without browser: {e}")
+        return None
+    
+    caption, image_url = parse_post_html(response.text, platform, embedded=True)
+    if not caption:
+        return None
+    
+    thumbnail = _download_thumbnail(session, image_url) if image_url else None
+    return caption, thumbnail
+
+@traced("get_caption_from_post")
 def get_caption_from_post(url, platform):
     """
     Extracts the caption from a social media post given its URL.
-    And saves a thumbnail of the video if present.
+    And captures a thumbnail of the video if present.
+    
+    The post is fetched with plain HTTP requests first, the browser is only
+    used when no caption is found that way (or SCRAPER_FAST_PATH=false).
     
     Args:
         url (str): The URL of the social media post.
         platform (str): The platform ("instagram", "tiktok", "i", etc.)
-        
+    
     Returns:
-        tuple: (caption, thumbnail_filename) if successful, otherwise None.
+        tuple: (caption, thumbnail bytes or None) if successful, otherwise None.
     """
     
     logger.info(f"Extracting caption from {platform} post: {url}")
     
+    if os.getenv("SCRAPER_FAST_PATH", "true").lower() == "true":
+        result = fetch_post_without_browser(url, platform)
+        if result:
+            logger.info(f"Caption found without browser ({len(result[0])} chars)")
+            return result
+        logger.info("No caption found without browser, falling back to the browser")
+    
     # Open browser with the specified URL and platform
     browser = open_browser(url, platform)
     if not browser:
@@ -28,53 +230,19 @@ def get_caption_from_post(url, platform):
     
     try:
         # Attempt to capture thumbnail
-        thumbnail_filename = capture_thumbnail(browser)
+        thumbnail = capture_thumbnail(browser, platform)
         
         # Parse the page content
         logger.info("Parsing page content")
-        source = browser.page_source
-        data = BeautifulSoup(source, 'html.parser')
-        
-        # Handle platform-specific caption extraction
-        if platform == "instagram" or platform == "i":
-            logger.info("Extracting Instagram caption")
-            caption = None
-            
-            try:
-                meta_desc = data.find('meta', attrs={'name': 'description'})
-                if meta_desc and meta_desc.get('content'):
-                    content = meta_desc.get('content')
-                    logger.info(f"Found meta description: {content[:50]}...")
-                    parts = content.split('"')
-                    if len(parts) >= 2:
-                        caption = parts[1]
-                        logger.info(f"Extracted Instagram caption from meta quotes: {caption}.")
-            except Exception as e:
-                logger.info(f"Error extracting caption from meta description: {e}", exc_info=True)
-            
-        else:
-            # Handle TikTok captions
-            logger.info("Extracting TikTok caption")
-            caption = None
-            try:
-                # Find caption in <img> alt attributes within <picture> elements
-                pictures = data.find_all('picture')
-                for picture in pictures:
-                    img = picture.find('img')
-                    if img and img.get('alt'):
-                        caption = img.get('alt')
-                        logger.info(f"Found TikTok caption from image alt: {caption[:50]}...")
-                        break
-            except Exception as e:
-                logger.info(f"Error extracting TikTok caption: {e}", exc_info=True)
+        caption, _ = parse_post_html(browser.page_source, platform)
         
         if caption:
-            logger.info(f"Caption found ({len(caption)} chars) and thumbnail saved to {thumbnail_filename}")
-            return caption, thumbnail_filename
+            logger.info(f"Caption found ({len(caption)} chars), thumbnail {'captured' if thumbnail else 'not found'}")
+            return caption, thumbnail
         else:
             logger.info("Caption not found")
             return None
-            
+    
     finally:
         # Always close the browser
-        close_browser(browser)
\ No newline at end of file
+        close_browser(browser)
@@ -0,0 +1,98 @@
+import os
+import time
+import uuid
+from io import BytesIO
+
+from PIL import Image
+
+from logs import setup_logging
+from scrapers.tracing import current_trace
+
+logger = setup_logging("thumbnails")
+
+# Image format, MIME type and file extension of the thumbnail uploaded to each API.
+# The maximum size (px) is THUMBNAIL_SIZE_<API> or THUMBNAIL_SIZE.
+THUMBNAIL_FORMATS = {
+    "TANDOOR": ("JPEG", "image/jpeg", "jpg"),
+    "MEALIE": ("JPEG", "image/jpeg", "jpg"),
+}
+
+def encode_thumbnail(image_bytes, api_type):
+    """
+    Resize and encode a thumbnail for the given API, in memory.
+    
+    Args:
+        image_bytes (bytes): The captured image (any format supported by Pillow).
+        api_type (str): Type of API the thumbnail is uploaded to ("TANDOOR" or "MEALIE").
+    
+    Returns:
+        tuple: (image bytes, MIME type, file extension)
+    """
+    api_type = api_type.upper()
+    image_format, mime_type, extension = THUMBNAIL_FORMATS[api_type]
+    max_size = int(os.getenv(f"THUMBNAIL_SIZE_{api_type}", os.getenv("THUMBNAIL_SIZE", 1024)))
+    
+    with Image.open(BytesIO(image_bytes)) as img:
+        # Convert to RGB if needed (in case of PNG with alpha channel)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[3])  # 3 is the alpha channel
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        img.thumbnail((max_size, max_size))
+        output = BytesIO()
+        img.save(output, format=image_format, quality=85)
+    
+    return output.getvalue(), mime_type, extension
+
+def save_thumbnail(image_bytes):
+    """
+    Keep a copy of a captured thumbnail on disk when THUMBNAIL_DIR is set.
+    There is one copy per job, replaced by the retries of the job. Copies
+    older than THUMBNAIL_MAX_AGE_HOURS are deleted.
+    
+    Args:
+        image_bytes (bytes): The captured image.
+    
+    Returns:
+        str or None: Path of the copy, None if no copy is kept.
+    """
+    directory = os.getenv("THUMBNAIL_DIR")
+    if not directory or not image_bytes:
+        return None
+    
+    try:
+        os.makedirs(directory, exist_ok=True)
+        cleanup_thumbnails(directory, float(os.getenv("THUMBNAIL_MAX_AGE_HOURS", 24)))
+        
+        # Named after the job, so concurrent jobs never overwrite each other.
+        # Captures outside of a job (command line) get a unique name.
+        trace = current_trace()
+        name = trace.job_id if trace and trace.job_id else uuid.uuid4().hex
+        path = os.path.join(directory, f"thumbnail_{name}")
+        with open(path, 'wb') as outfile:
+            outfile.write(image_bytes)
+        logger.info(f"Thumbnail saved to {path}")
+        return path
+    except OSError as e:
+        logger.info(f"Failed to save thumbnail: {e}")
+        return None
+
+def cleanup_thumbnails(directory, max_age_hours):
+    """
+    Delete the thumbnail copies older than max_age_hours.
+    
+    Args:
+        directory (str): The thumbnail directory.
+        max_age_hours (float): Maximum age of the copies.
+    """
+    limit = time.time() - max_age_hours * 3600
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.startswith("thumbnail_") and entry.stat().st_mtime < limit:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
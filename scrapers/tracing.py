@@ -0,0 +1,142 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_progress_callback = contextvars.ContextVar("progress_callback", default=None)
+
+class Trace:
+    """
+    Collects the timing spans of the stages of a job.
+    """
+    
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.spans = []
+        self._lock = threading.Lock()
+    
+    def add(self, name, started_at, ended_at, outcome, error=None):
+        """
+        Record a finished stage.
+        
+        Args:
+            name (str): The name of the stage.
+            started_at (float): Start time (epoch seconds).
+            ended_at (float): End time (epoch seconds).
+            outcome (str): "ok" or "error".
+            error (str, optional): The error message if the stage failed.
+        """
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "started_at": started_at,
+                "ended_at": ended_at,
+                "duration": ended_at - started_at,
+                "outcome": outcome,
+                "error": error
+            })
+    
+    def durations(self):
+        """
+        Get the total duration of every stage.
+        
+        Returns:
+            dict: Stage name -> total seconds.
+        """
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] = totals.get(span["name"], 0) + span["duration"]
+        return totals
+
+def current_trace():
+    """
+    Get the trace collecting the spans of the current context.
+    
+    Returns:
+        Trace or None: The current trace, None outside of start_trace().
+    """
+    return _current_trace.get()
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of values"""
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+@contextmanager
+def start_trace(job_id=None):
+    """
+    Collect the spans of the code running in this context.
+    
+    Args:
+        job_id (str, optional): The ID of the job running in this context.
+    
+    Yields:
+        Trace: The trace receiving the spans.
+    """
+    trace = Trace(job_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+@contextmanager
+def span(name):
+    """
+    Time a stage and record it in the current trace (if any).
+    
+    Args:
+        name (str): The name of the stage.
+    """
+    trace = _current_trace.get()
+    started_at = time.time()
+    try:
+        yield
+    except Exception as e:
+        if trace:
+            trace.add(name, started_at, time.time(), "error", str(e))
+        raise
+    else:
+        if trace:
+            trace.add(name, started_at, time.time(), "ok")
+
+def traced(name):
+    """Decorator recording every call of the function as a stage"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def progress_reporter(callback):
+    """
+    Receive the progress reported by the code running in this context.
+    
+    Args:
+        callback (callable): Called with (message, fraction), fraction is
+            between 0 and 1 or None when the total is unknown.
+    """
+    token = _progress_callback.set(callback)
+    try:
+        yield
+    finally:
+        _progress_callback.reset(token)
+
+def report_progress(message, fraction=None):
+    """
+    Report the progress of the current job (ignored outside of progress_reporter()).
+    
+    Args:
+        message (str): What was done, e.g. "Step 3 of 7 received".
+        fraction (float, optional): Part of the work done, between 0 and 1.
+    """
+    callback = _progress_callback.get()
+    if callback:
+        callback(message, fraction)
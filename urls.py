@@ -0,0 +1,58 @@
+import re
+from urllib.parse import urlsplit
+
+INSTAGRAM_POST_PATTERN = re.compile(r'^/(?:[A-Za-z0-9_.]+/)?(?:p|reel|reels|tv)/([A-Za-z0-9_-]+)')
+TIKTOK_VIDEO_PATTERN = re.compile(r'^/@[^/]*/(?:video|photo)/([0-9]+)')
+
+def canonicalize_url(url, platform=None):
+    """
+    Build a canonical URL identifying a post, so the same post submitted with
+    different query strings or host variants can be recognized.
+    
+    Args:
+        url (str): The URL of the post.
+        platform (str, optional): The platform ("instagram" or "tiktok").
+    
+    Returns:
+        str: The canonical URL. Falls back to the URL without query string and
+        fragment if the post ID can't be found.
+    """
+    url = url.strip()
+    if not re.match(r'^https?://', url, re.IGNORECASE):
+        url = f'https://{url}'
+    
+    parts = urlsplit(url)
+    host = parts.netloc.lower().split(':')[0]
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = parts.path or '/'
+    
+    if host == 'instagram.com' or platform in ('instagram', 'i'):
+        match = INSTAGRAM_POST_PATTERN.match(path)
+        if match:
+            return f'https://www.instagram.com/p/{match.group(1)}/'
+    
+    if host == 'tiktok.com' or platform in ('tiktok', 't'):
+        match = TIKTOK_VIDEO_PATTERN.match(path)
+        if match:
+            return f'https://www.tiktok.com/@/video/{match.group(1)}'
+    
+    return f'https://{host}{path.rstrip("/") or "/"}'
+
+def detect_platform(url):
+    """
+    Detect the platform of a post URL.
+    
+    Args:
+        url (str): The URL of the post.
+    
+    Returns:
+        str or None: "instagram", "tiktok" or None if the platform is unknown.
+    """
+    host = urlsplit(url if '://' in url else f'https://{url}').netloc.lower()
+    if host == 'instagram.com' or host.endswith('.instagram.com'):
+        return 'instagram'
+    if host == 'tiktok.com' or host.endswith('.tiktok.com'):
+        return 'tiktok'
+    return None
@@ -1,33 +1,265 @@
-from datetime import datetime
+import argparse
+from datetime import datetime, timedelta
+import os
+import queue
+import signal
+import socket
+import threading
+import time
 import traceback
 
+from flask import Flask
+from sqlalchemy import func, or_
+
+import config
+from events import job_events
+from job_store import job_store
 from logs import setup_logging
-from models import db, Job
+from metrics import ACTIVE_JOBS, JOB_DURATION, serve_worker_metrics
+from models import db, Job, JobStage, upgrade_schema
+from scrapers.manage_browser import browser_pool
 from scrapers.scrape_for_mealie import scrape_recipe_for_mealie
 from scrapers.scrape_for_tandoor import scrape_recipe_for_tandoor
+from scrapers.scrape_for_targets import TARGETS, scrape_recipe_for_targets
+from scrapers.tracing import current_trace, progress_reporter, span, start_trace
 
 logger = setup_logging("job_processor")
 
+# Name of this process in the job leases
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+# Oldest due jobs tried by claim_next_job() when rows can't be locked
+CLAIM_CANDIDATES = 5
+
 def update_job_status(job_id, status, progress=None, message=None, result=None, result_url=None):
-    """Update job status in the database"""
-    from app import app
-    with app.app_context():
-        job = Job.query.get(job_id)
-        if job:
-            job.status = status
-            if progress is not None:
-                job.progress = progress
-            if message is not None:
-                job.message = message
-            if result is not None:
-                job.result = result
-            if result_url is not None:
-                job.result_url = result_url
-            
-            if status in ['completed', 'failed']:
-                job.completed_at = datetime.now()
-                
+    """Update job status (written to the database by the job state store)"""
+    fields = {'status': status}
+    if progress is not None:
+        fields['progress'] = progress
+    if message is not None:
+        fields['message'] = message
+    if result is not None:
+        fields['result'] = result
+    if result_url is not None:
+        fields['result_url'] = result_url
+    
+    if status in ['completed', 'failed']:
+        fields['completed_at'] = datetime.now()
+        fields['lease_expires_at'] = None
+        # Store the stages before the final status so they are there when the job page reloads
+        save_job_stages(job_id)
+    
+    job_store.update(job_id, **fields)
+
+def save_job_stages(job_id):
+    """Store the spans recorded by the current trace as stages of the job"""
+    trace = current_trace()
+    if not trace or not trace.spans:
+        return
+    
+    stages = [
+        JobStage(
+            job_id=job_id,
+            name=stage['name'],
+            started_at=datetime.fromtimestamp(stage['started_at']),
+            ended_at=datetime.fromtimestamp(stage['ended_at']),
+            duration=stage['duration'],
+            outcome=stage['outcome'],
+            error=stage['error'][:512] if stage['error'] else None
+        )
+        for stage in list(trace.spans)
+    ]
+    try:
+        db.session.add_all(stages)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Failed to save stages of job {job_id}: {e}")
+
+def report_job_progress(job_id, start, end):
+    """
+    Get a progress callback publishing the messages of the scraper in the job status.
+    
+    Args:
+        job_id (str): The ID of the job.
+        start (int): Progress of the job when the scraper starts.
+        end (int): Progress of the job when the scraper is done.
+    """
+    def callback(message, fraction=None):
+        progress = start + round((end - start) * fraction) if fraction is not None else None
+        update_job_status(job_id, 'processing', progress, message)
+    return callback
+
+def claim_job(job_id, lease_seconds):
+    """
+    Take the lease of a pending job. The status is checked and changed in a
+    single UPDATE, so only one worker can claim a job.
+    
+    Args:
+        job_id (str): The ID of the job.
+        lease_seconds (int): Seconds before the lease expires if it's not renewed.
+    
+    Returns:
+        bool: True if the job was claimed by this worker.
+    """
+    claimed = Job.query.filter(
+        Job.id == job_id,
+        Job.status == 'pending',
+        _is_due()
+    ).update(_claim_values(lease_seconds), synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def claim_next_job(lease_seconds):
+    """
+    Take the lease of the oldest pending job that is due.
+    
+    On PostgreSQL the job is locked with SELECT ... FOR UPDATE SKIP LOCKED,
+    so concurrent workers each get a different job without waiting for each
+    other. Other databases (SQLite) fall back to claim_job() on the oldest
+    due jobs until one of them is not taken by another worker.
+    
+    Args:
+        lease_seconds (int): Seconds before the lease expires if it's not renewed.
+    
+    Returns:
+        str or None: The ID of the claimed job, None if no job is waiting.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        job = Job.query.with_entities(Job.id).filter(
+            Job.status == 'pending',
+            _is_due()
+        ).order_by(Job.created_at).with_for_update(skip_locked=True).first()
+        if not job:
             db.session.commit()
+            return None
+        # The row stays locked until the commit
+        Job.query.filter(Job.id == job.id).update(_claim_values(lease_seconds), synchronize_session=False)
+        db.session.commit()
+        return job.id
+    
+    for job_id in due_jobs(CLAIM_CANDIDATES):
+        if claim_job(job_id, lease_seconds):
+            return job_id
+    return None
+
+def _is_due():
+    return or_(Job.next_attempt_at.is_(None), Job.next_attempt_at <= datetime.now())
+
+def _claim_values(lease_seconds):
+    return {
+        'status': 'processing',
+        'claimed_by': WORKER_ID,
+        'lease_expires_at': datetime.now() + timedelta(seconds=lease_seconds),
+        'attempts': func.coalesce(Job.attempts, 0) + 1,
+        'next_attempt_at': None
+    }
+
+def renew_leases(job_ids, lease_seconds):
+    """Extend the leases of the jobs this worker is processing"""
+    Job.query.filter(
+        Job.id.in_(job_ids),
+        Job.status == 'processing',
+        Job.claimed_by == WORKER_ID
+    ).update({'lease_expires_at': datetime.now() + timedelta(seconds=lease_seconds)}, synchronize_session=False)
+    db.session.commit()
+
+def reclaim_expired_leases(max_attempts):
+    """
+    Put the jobs whose worker stopped renewing the lease (crash, restart)
+    back to pending, or fail them if they have no attempts left.
+    
+    Args:
+        max_attempts (int): Attempts of the jobs without their own maximum.
+    
+    Returns:
+        int: The number of reclaimed jobs.
+    """
+    now = datetime.now()
+    expired = or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now)
+    reclaimed = 0
+    for job in Job.query.filter(Job.status == 'processing', expired).all():
+        attempts = job.attempts or 1
+        job_max_attempts = job.max_attempts or max_attempts
+        if attempts < job_max_attempts:
+            values = {
+                'status': 'pending',
+                'progress': 0,
+                'message': f'Worker stopped during attempt {attempts} of {job_max_attempts}, retrying...',
+                'next_attempt_at': now
+            }
+        else:
+            values = {
+                'status': 'failed',
+                'progress': 0,
+                'message': f'Worker stopped during the last attempt ({attempts} of {job_max_attempts})',
+                'completed_at': now
+            }
+        values.update({'claimed_by': None, 'lease_expires_at': None})
+        # Skip the job if its lease was renewed in the meantime
+        reclaimed += Job.query.filter(Job.id == job.id, Job.status == 'processing', expired).update(values, synchronize_session=False)
+    db.session.commit()
+    if reclaimed:
+        logger.warning(f"Reclaimed {reclaimed} jobs with an expired lease")
+    return reclaimed
+
+def due_jobs(limit):
+    """
+    Get the pending jobs that can be processed now, oldest first.
+    
+    Returns:
+        list: The IDs of the jobs.
+    """
+    jobs = Job.query.with_entities(Job.id).filter(
+        Job.status == 'pending',
+        _is_due()
+    ).order_by(Job.created_at).limit(limit)
+    return [job.id for job in jobs]
+
+def maintain_leases(job_ids, config):
+    """
+    Renew the leases of the jobs this worker is processing and reclaim the
+    expired leases of the other workers.
+    
+    Args:
+        job_ids (list): The IDs of the jobs being processed.
+        config (dict): The app configuration (JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS).
+    """
+    if job_ids:
+        renew_leases(job_ids, config['JOB_LEASE_SECONDS'])
+    reclaim_expired_leases(config['JOB_MAX_ATTEMPTS'])
+
+def schedule_retry(job, error, config):
+    """
+    Put a failed job back to pending if it has attempts left. The delay
+    before the next attempt doubles with every attempt.
+    
+    Args:
+        job (Job): The failed job.
+        error (str): Why the attempt failed.
+        config (dict): The app configuration (JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF).
+    
+    Returns:
+        bool: True if the job will be retried.
+    """
+    attempts = job.attempts or 1
+    max_attempts = job.max_attempts or config['JOB_MAX_ATTEMPTS']
+    if attempts >= max_attempts:
+        return False
+    
+    delay = config['JOB_RETRY_BACKOFF'] * 2 ** (attempts - 1)
+    logger.info(f"Attempt {attempts} of job {job.id} failed, retrying in {delay:.0f}s")
+    # Keep the stages of the failed attempt
+    save_job_stages(job.id)
+    job_store.update(
+        job.id,
+        status='pending',
+        progress=0,
+        message=f'Attempt {attempts} of {max_attempts} failed, retrying in {delay:.0f}s: {error}'[:512],
+        claimed_by=None,
+        lease_expires_at=None,
+        next_attempt_at=datetime.now() + timedelta(seconds=delay)
+    )
+    return True
 
 def is_valid_url(url, platform):
     """Validate URL format"""
@@ -37,16 +269,31 @@ def is_valid_url(url, platform):
         return 'tiktok.com' in url
     return False
 
-def process_scraping_job(job_id):
-    """Process a scraping job"""
-    from app import app
+def process_scraping_job(job_id, app=None, claimed=False):
+    """
+    Process a scraping job, recording the time spent in every stage.
     
-    with app.app_context():
+    Args:
+        job_id (str): The ID of the job.
+        app (Flask, optional): The application of the database. Defaults to the web app.
+        claimed (bool, optional): The job was already claimed by this worker. Defaults to False.
+    """
+    if app is None:
+        from app import app
+    
+    with app.app_context(), start_trace(job_id):
+        if not claimed and not claim_job(job_id, app.config['JOB_LEASE_SECONDS']):
+            logger.info(f"Job {job_id} is not waiting or was claimed by another worker")
+            return
+        
         job = Job.query.get(job_id)
         if not job:
             logger.info(f"Job {job_id} not found")
             return
         
+        platform, target = job.platform, job.target
+        completed_targets = job.completed_targets.split(',') if job.completed_targets else []
+        started = time.perf_counter()
         try:
             # Update status to processing
             update_job_status(job_id, 'processing', 10, 'Starting job...')
@@ -66,23 +313,41 @@ def process_scraping_job(job_id):
             if job.target == 'tandoor':
                 update_job_status(job_id, 'processing', 40, 'Processing for Tandoor...')
                 logger.info(f"Processing for Tandoor: {job.url}")
-                result = scrape_recipe_for_tandoor(job.url, job.platform)
+                with span("scrape_for_tandoor"), progress_reporter(report_job_progress(job_id, 40, 80)):
+                    result = scrape_recipe_for_tandoor(job.url, job.platform, use_cache=not job.bypass_cache, backend=job.llm_backend)
             elif job.target == 'mealie':
                 update_job_status(job_id, 'processing', 40, 'Processing for Mealie...')
                 logger.info(f"Processing for Mealie: {job.url}")
-                result = scrape_recipe_for_mealie(job.url, job.platform)
+                with span("scrape_for_mealie"), progress_reporter(report_job_progress(job_id, 40, 80)):
+                    result = scrape_recipe_for_mealie(job.url, job.platform, use_cache=not job.bypass_cache, backend=job.llm_backend)
+            elif job.target == 'both':
+                update_job_status(job_id, 'processing', 40, 'Processing for Tandoor and Mealie...')
+                logger.info(f"Processing for Tandoor and Mealie: {job.url}")
+                with span("scrape_for_both"), progress_reporter(report_job_progress(job_id, 40, 80)):
+                    result = scrape_recipe_for_targets(
+                        job.url, job.platform, TARGETS['both'], use_cache=not job.bypass_cache, backend=job.llm_backend,
+                        skip_targets=completed_targets
+                    )
                 
             # Check if result indicates an error
             if isinstance(result, dict) and result.get('status') == 'error':
                 error_message = result.get('error', 'Unknown error')
                 logger.error(f"API error in job {job_id}: {error_message}")
-                update_job_status(
-                    job_id, 
-                    'failed', 
-                    0, 
-                    f'Error scraping recipe',
-                    result=str(result)
-                )
+                # Don't send the recipe again to the targets that got it, a retry would duplicate it
+                completed_targets += [
+                    name for name, target_result in result.get('results', {}).items()
+                    if target_result.get('status') == 'success'
+                ]
+                if completed_targets:
+                    job_store.update(job_id, completed_targets=','.join(completed_targets))
+                if not schedule_retry(job, error_message, app.config):
+                    update_job_status(
+                        job_id, 
+                        'failed', 
+                        0, 
+                        f'Error scraping recipe',
+                        result=str(result)
+                    )
                 return
             
             update_job_status(job_id, 'processing', 80, 'Finishing up...')
@@ -106,10 +371,293 @@ def process_scraping_job(job_id):
         except Exception as e:
             error_details = traceback.format_exc()
             logger.info(f"Error in job {job_id}: {str(e)}", exc_info=True)
-            update_job_status(
-                job_id, 
-                'failed', 
-                0, 
-                f'Error: {str(e)}',
-                result=error_details
-            )
\ No newline at end of file
+            if not schedule_retry(job, str(e), app.config):
+                update_job_status(
+                    job_id, 
+                    'failed', 
+                    0, 
+                    f'Error: {str(e)}',
+                    result=error_details
+                )
+        
+        finally:
+            JOB_DURATION.labels(platform, target).observe(time.perf_counter() - started)
+
+class JobScheduler:
+    """
+    Runs scraping jobs on a fixed number of worker threads fed by a bounded queue.
+    
+    Jobs stay in the 'pending' state while they wait in the queue, so their
+    position can be reported back to the user. The database is the source of
+    truth: a worker claims a job with a lease before processing it, and a
+    sweeper renews the leases of the running jobs, reclaims the expired ones
+    and queues the pending jobs left by a restart or waiting for a retry.
+    """
+    
+    def __init__(self, worker_count, queue_size):
+        self.worker_count = max(1, worker_count)
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._workers = []
+        self._lock = threading.Lock()
+        # Jobs in the queue and jobs being processed, so they are not queued twice
+        self._queued = set()
+        self._active = set()
+        self._jobs_lock = threading.Lock()
+        self._app = None
+        
+    def start(self):
+        """Start the worker threads (only once)"""
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.worker_count):
+                worker = threading.Thread(
+                    target=self._run_worker,
+                    name=f"job-worker-{i + 1}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+        logger.info(f"Started {self.worker_count} job workers (queue size {self._queue.maxsize})")
+    
+    def init_app(self, app):
+        """
+        Start the sweeper of the job leases (only once).
+        
+        Args:
+            app (Flask): The Flask application.
+        """
+        if self._app is not None:
+            return
+        self._app = app
+        threading.Thread(
+            target=self._run_sweeper,
+            args=(app.config['JOB_SWEEP_INTERVAL'],),
+            name="job-sweeper",
+            daemon=True
+        ).start()
+    
+    def submit(self, job_id):
+        """
+        Add a job to the queue.
+        
+        Args:
+            job_id (str): The ID of the job to process.
+            
+        Returns:
+            bool: True if the job was queued (or already is), False if the queue is full.
+        """
+        self.start()
+        with self._jobs_lock:
+            if job_id in self._queued or job_id in self._active:
+                return True
+            try:
+                self._queue.put_nowait(job_id)
+            except queue.Full:
+                logger.warning(f"Job queue is full, rejecting job {job_id}")
+                return False
+            self._queued.add(job_id)
+        logger.info(f"Queued job {job_id} (queue depth {self.queue_depth()})")
+        return True
+    
+    def sweep(self):
+        """
+        Renew the leases of the running jobs, reclaim the expired leases and
+        queue the pending jobs that are due.
+        """
+        config = self._app.config
+        with self._app.app_context():
+            with self._jobs_lock:
+                active = list(self._active)
+            maintain_leases(active, config)
+            
+            free = self._queue.maxsize - self._queue.qsize()
+            if free <= 0:
+                return
+            with self._jobs_lock:
+                known = len(self._queued) + len(self._active)
+            for job_id in due_jobs(free + known):
+                if not self.submit(job_id):
+                    break
+    
+    def queue_depth(self):
+        """Number of jobs waiting for a worker"""
+        return self._queue.qsize()
+    
+    def queue_position(self, job_id):
+        """
+        Get the 1-based position of a job in the queue.
+        
+        Returns:
+            int or None: The position, or None if the job is not waiting in the queue.
+        """
+        with self._queue.mutex:
+            waiting = list(self._queue.queue)
+        try:
+            return waiting.index(job_id) + 1
+        except ValueError:
+            return None
+    
+    def _run_worker(self):
+        while True:
+            job_id = self._queue.get()
+            with self._jobs_lock:
+                self._queued.discard(job_id)
+                self._active.add(job_id)
+            self._publish_queue_positions()
+            try:
+                with ACTIVE_JOBS.track_inprogress():
+                    process_scraping_job(job_id)
+            except Exception as e:
+                logger.error(f"Unhandled error in worker for job {job_id}: {e}", exc_info=True)
+            finally:
+                with self._jobs_lock:
+                    self._active.discard(job_id)
+                self._queue.task_done()
+    
+    def _run_sweeper(self, interval):
+        # First sweep right away to pick up the jobs left by a restart
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Failed to sweep the job leases: {e}", exc_info=True)
+            time.sleep(interval)
+    
+    def _publish_queue_positions(self):
+        # Tell the waiting jobs that they moved up in the queue
+        with self._queue.mutex:
+            waiting = list(self._queue.queue)
+        for position, job_id in enumerate(waiting, start=1):
+            if job_events.has_subscribers(job_id):
+                job_events.publish(job_id, {'status': 'pending', 'queue_position': position})
+
+class JobPoller:
+    """
+    Runs scraping jobs in a standalone worker process (python -m workers).
+    
+    The worker threads claim the pending jobs straight from the shared job
+    table instead of an in-memory queue, so any number of worker processes
+    can run next to the web app, each with its own browsers and LLM limits.
+    The main thread renews the leases of the running jobs and reclaims the
+    expired ones.
+    """
+    
+    def __init__(self, app, worker_count, poll_interval):
+        self.worker_count = max(1, worker_count)
+        self.poll_interval = poll_interval
+        self._app = app
+        self._workers = []
+        self._active = set()
+        self._jobs_lock = threading.Lock()
+        self._stopping = threading.Event()
+    
+    def run(self):
+        """Process jobs until stop() is called, then wait for the running jobs"""
+        for i in range(self.worker_count):
+            worker = threading.Thread(
+                target=self._run_worker,
+                name=f"job-worker-{i + 1}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"Worker {WORKER_ID} started {self.worker_count} job workers")
+        
+        interval = self._app.config['JOB_SWEEP_INTERVAL']
+        while True:
+            try:
+                with self._app.app_context():
+                    with self._jobs_lock:
+                        active = list(self._active)
+                    maintain_leases(active, self._app.config)
+            except Exception as e:
+                logger.error(f"Failed to sweep the job leases: {e}", exc_info=True)
+            if self._stopping.wait(interval):
+                break
+        
+        # Keep renewing the leases while the running jobs finish
+        while any(worker.is_alive() for worker in self._workers):
+            for worker in self._workers:
+                worker.join(interval)
+            with self._app.app_context(), self._jobs_lock:
+                if self._active:
+                    renew_leases(list(self._active), self._app.config['JOB_LEASE_SECONDS'])
+        job_store.flush()
+        logger.info(f"Worker {WORKER_ID} stopped")
+    
+    def stop(self, *args):
+        """Stop claiming jobs (also used as signal handler)"""
+        if not self._stopping.is_set():
+            logger.info("Stopping, waiting for the running jobs to finish")
+            self._stopping.set()
+    
+    def _run_worker(self):
+        while not self._stopping.is_set():
+            try:
+                with self._app.app_context():
+                    job_id = claim_next_job(self._app.config['JOB_LEASE_SECONDS'])
+            except Exception as e:
+                logger.error(f"Failed to claim a job: {e}", exc_info=True)
+                job_id = None
+            if not job_id:
+                self._stopping.wait(self.poll_interval)
+                continue
+            
+            with self._jobs_lock:
+                self._active.add(job_id)
+            try:
+                with ACTIVE_JOBS.track_inprogress():
+                    process_scraping_job(job_id, self._app, claimed=True)
+            except Exception as e:
+                logger.error(f"Unhandled error in worker for job {job_id}: {e}", exc_info=True)
+            finally:
+                with self._jobs_lock:
+                    self._active.discard(job_id)
+
+def create_worker_app():
+    """
+    Create the Flask application of a standalone worker: the database and
+    the job state store, without the web routes.
+    
+    Returns:
+        Flask: The application.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config.Config)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+    job_store.init_app(app)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone worker processing the scraping jobs of the shared database")
+    parser.add_argument("--workers", type=int, default=None, help="Jobs processed in parallel (default: WORKER_COUNT)")
+    parser.add_argument("--poll-interval", type=float, default=None, help="Seconds between two looks for new jobs when idle (default: WORKER_POLL_INTERVAL)")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Port of the Prometheus metrics, 0 to disable (default: WORKER_METRICS_PORT)")
+    args = parser.parse_args()
+    
+    app = create_worker_app()
+    poller = JobPoller(
+        app,
+        args.workers or app.config['WORKER_COUNT'],
+        args.poll_interval or app.config['WORKER_POLL_INTERVAL']
+    )
+    signal.signal(signal.SIGTERM, poller.stop)
+    signal.signal(signal.SIGINT, poller.stop)
+    
+    metrics_port = app.config['WORKER_METRICS_PORT'] if args.metrics_port is None else args.metrics_port
+    if metrics_port:
+        serve_worker_metrics(metrics_port, browser_pool)
+        logger.info(f"Serving metrics on port {metrics_port}")
+    
+    # Pre-launch browsers so the first jobs don't wait for browser startup
+    if os.environ.get('BROWSER_POOL_WARM', 'true').lower() == 'true':
+        threading.Thread(target=browser_pool.warm, daemon=True).start()
+    
+    poller.run()
+
+if __name__ == "__main__":
+    main()